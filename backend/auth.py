@@ -1,7 +1,9 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi import HTTPException, status
+from cache import TTLCache
 import os
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
@@ -10,6 +12,11 @@ if not SECRET_KEY:
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 60))
 
+token_cache = TTLCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL", 300)),
+)
+
 def create_access_token(user_id: int):
     payload = {
         "sub": str(user_id),
@@ -18,6 +25,9 @@ def create_access_token(user_id: int):
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
 
 def verify_access_token(token: str):
+    cached = token_cache.get(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
@@ -27,7 +37,10 @@ def verify_access_token(token: str):
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token",
             )
-        return int(user_id)
+        user_id = int(user_id)
+        exp = payload.get("exp")
+        token_cache.set(token, user_id, ttl=exp - time.time() if exp else None)
+        return user_id
 
     except JWTError:
         raise HTTPException(
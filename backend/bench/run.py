@@ -0,0 +1,246 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import httpx
+import socketio
+import uvicorn
+from sqlalchemy import event, select
+
+import database
+import models
+from auth import create_access_token
+from bench.seed import BENCH_EMAIL_DOMAIN, WORDS
+
+SCENARIOS = ["search", "trade_requests", "conversations", "chat_history", "send_message"]
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def attach(self, *engines):
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the SkillBarter REST and Socket.IO paths.")
+    parser.add_argument("--url", default="",
+                        help="benchmark an already running server instead of starting one in-process "
+                             "(query counts are only available in-process)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=500, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--users", type=int, default=200, help="bench users to spread load across")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", default="", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+def load_actors(limit: int):
+    conv = models.Conversation
+    bench_user = models.User.email.like(f"%@{BENCH_EMAIL_DOMAIN}")
+    with database.engine.connect() as conn:
+        rows = conn.execute(
+            select(conv.user_a_id, conv.user_b_id)
+            .join(models.User, models.User.id == conv.user_a_id)
+            .where(bench_user)
+            .order_by(conv.conversation_key)
+            .limit(limit)
+        ).all()
+        if not rows:
+            rows = conn.execute(
+                select(models.User.id, models.User.id).where(bench_user).order_by(models.User.id).limit(limit)
+            ).all()
+    if not rows:
+        raise SystemExit("No benchmark data found; run `python -m bench.seed` first.")
+    return [(a, b, create_access_token(a)) for a, b in rows]
+
+def start_server(port: int):
+    import main
+
+    # The per-user limits would throttle the benchmark's own hot loops.
+    main.ratelimit.limiter.enabled = False
+    config = uvicorn.Config(main.asgi_app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise SystemExit("Server failed to start")
+        time.sleep(0.05)
+    return server, thread
+
+def percentile(sorted_values, pct: float):
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def rest_request(name: str, rng: random.Random):
+    def build(actor):
+        user_id, partner_id, token = actor
+        headers = {"Authorization": f"Bearer {token}"}
+        if name == "search":
+            return "/search", {"q": rng.choice(WORDS)[:rng.randint(3, 6)]}, headers
+        if name == "trade_requests":
+            return "/trade/requests", None, headers
+        if name == "conversations":
+            return "/chat/conversations", None, headers
+        return f"/chat/user/{partner_id}", None, headers
+    return build
+
+async def run_rest(base_url, name, actors, rng, total, concurrency):
+    build = rest_request(name, rng)
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker(client):
+        nonlocal errors
+        for _ in remaining:
+            path, params, headers = build(rng.choice(actors))
+            started = time.perf_counter()
+            try:
+                response = await client.get(path, params=params, headers=headers)
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+async def run_send_message(base_url, actors, rng, total, concurrency):
+    latencies, errors = [], 0
+    remaining = iter(range(total))
+
+    async def worker(actor):
+        nonlocal errors
+        user_id, partner_id, token = actor
+        client = socketio.AsyncClient()
+        loop = asyncio.get_running_loop()
+        registered = loop.create_future()
+        reply = None
+
+        def settle(future, ok):
+            if future is not None and not future.done():
+                future.set_result(ok)
+
+        client.on("register_success", lambda data: settle(registered, True))
+        client.on("register_error", lambda data: settle(registered, False))
+        client.on("message_sent", lambda data: settle(reply, True))
+        client.on("message_error", lambda data: settle(reply, False))
+
+        await client.connect(base_url, transports=["websocket"])
+        try:
+            await client.emit("register", {"token": token})
+            if not await asyncio.wait_for(registered, 10):
+                raise RuntimeError("register failed")
+            for i in remaining:
+                reply = loop.create_future()
+                started = time.perf_counter()
+                await client.emit("send_message", {
+                    "receiver_id": partner_id,
+                    "message": f"bench {i} {rng.choice(WORDS)}",
+                })
+                try:
+                    ok = await asyncio.wait_for(reply, 30)
+                except asyncio.TimeoutError:
+                    ok = False
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+        finally:
+            await client.disconnect()
+
+    workers = [rng.choice(actors) for _ in range(concurrency)]
+    await asyncio.gather(*(worker(actor) for actor in workers))
+    return latencies, errors
+
+async def run_scenario(args, base_url, name, actors, rng, total):
+    if name == "send_message":
+        return await run_send_message(base_url, actors, rng, total, args.concurrency)
+    return await run_rest(base_url, name, actors, rng, total, args.concurrency)
+
+async def benchmark(args, base_url, counter):
+    rng = random.Random(args.seed)
+    actors = load_actors(args.users)
+    results = []
+    for name in args.scenarios.split(","):
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+        if args.warmup:
+            await run_scenario(args, base_url, name, actors, rng, args.warmup)
+
+        queries_before = counter.count if counter else None
+        started = time.perf_counter()
+        latencies, errors = await run_scenario(args, base_url, name, actors, rng, args.requests)
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        completed = len(latencies)
+        results.append({
+            "scenario": name,
+            "requests": completed,
+            "errors": errors,
+            "throughput": completed / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "queries_per_request": (
+                (counter.count - queries_before) / (completed + errors) if counter and completed + errors else None
+            ),
+        })
+    return results
+
+def print_report(results):
+    header = f"{'scenario':<16}{'ok':>7}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        queries = "-" if r["queries_per_request"] is None else f"{r['queries_per_request']:.2f}"
+        print(
+            f"{r['scenario']:<16}{r['requests']:>7}{r['errors']:>6}{r['throughput']:>10.1f}"
+            f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{queries:>8}"
+        )
+
+def main(argv=None):
+    args = parse_args(argv)
+    server = counter = None
+    base_url = args.url.rstrip("/")
+    if not base_url:
+        counter = QueryCounter()
+        counter.attach(
+            database.engine,
+            database.async_engine.sync_engine,
+            *(e.sync_engine for e in database.read_engines),
+        )
+        server, thread = start_server(args.port)
+        base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        results = asyncio.run(benchmark(args, base_url, counter))
+    finally:
+        if server is not None:
+            server.should_exit = True
+            thread.join(timeout=10)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
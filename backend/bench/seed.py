@@ -0,0 +1,157 @@
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert
+
+import chat
+import models
+import partitions
+import passwords
+from database import engine
+
+BENCH_EMAIL_DOMAIN = "bench.local"
+BATCH_SIZE = 5000
+
+CATEGORIES = [
+    "Programming", "Design", "Music", "Languages", "Cooking",
+    "Fitness", "Photography", "Writing", "Marketing", "Finance",
+]
+WORDS = [
+    "python", "javascript", "react", "sql", "guitar", "piano", "spanish",
+    "french", "baking", "yoga", "running", "portrait", "editing", "poetry",
+    "seo", "budgeting", "illustration", "figma", "drums", "german", "pasta",
+    "climbing", "lighting", "copywriting", "excel", "rust", "docker", "singing",
+]
+STATUSES = ["pending", "accepted", "rejected"]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic SkillBarter dataset.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--skills-per-user", type=int, default=5)
+    parser.add_argument("--wants-per-user", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages-per-conversation", type=int, default=50)
+    parser.add_argument("--password", default="benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args(argv)
+
+def chunked(rows, size=BATCH_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i:i + size]
+
+def insert_ids(conn, table, rows):
+    ids = []
+    for chunk in chunked(rows):
+        result = conn.execute(insert(table).returning(table.id, sort_by_parameter_order=True), chunk)
+        ids.extend(result.scalars().all())
+    return ids
+
+def seed(args):
+    rng = random.Random(args.seed)
+    password = passwords.pwd_context.hash(args.password)
+
+    with engine.begin() as conn:
+        # Previous benchmark data is replaced so every run starts from the
+        # same dataset; cascades take the users' skills, requests and chats.
+        conn.execute(delete(models.User).where(models.User.email.like(f"%@{BENCH_EMAIL_DOMAIN}")))
+
+        user_ids = insert_ids(conn, models.User, [
+            {
+                "username": f"bench_{i}",
+                "email": f"bench_{i}@{BENCH_EMAIL_DOMAIN}",
+                "password": password,
+            }
+            for i in range(args.users)
+        ])
+
+        skill_rows = []
+        for user_id in user_ids:
+            for _ in range(args.skills_per_user):
+                words = rng.sample(WORDS, 2)
+                skill_rows.append({
+                    "name": " ".join(w.title() for w in words),
+                    "category": rng.choice(CATEGORIES),
+                    "description": f"I can teach {words[0]} and some {' '.join(rng.sample(WORDS, 3))}",
+                    "user_id": user_id,
+                })
+        skill_ids = insert_ids(conn, models.Skill, skill_rows)
+        skill_owners = [(skill_id, row["user_id"]) for skill_id, row in zip(skill_ids, skill_rows)]
+
+        want_rows = [
+            {"name": rng.choice(WORDS).title(), "category": rng.choice(CATEGORIES), "user_id": user_id}
+            for user_id in user_ids
+            for _ in range(args.wants_per_user)
+        ]
+        insert_ids(conn, models.WantedSkill, want_rows)
+
+        request_rows = []
+        for _ in range(args.requests if len(user_ids) > 1 else 0):
+            skill_id, receiver_id = rng.choice(skill_owners)
+            sender_id = rng.choice(user_ids)
+            while sender_id == receiver_id:
+                sender_id = rng.choice(user_ids)
+            request_rows.append({
+                "sender_id": sender_id,
+                "receiver_id": receiver_id,
+                "skill_id": skill_id,
+                "status": rng.choices(STATUSES, weights=[5, 4, 1])[0],
+            })
+        insert_ids(conn, models.TradeRequest, request_rows)
+
+        pairs = set()
+        while len(user_ids) > 1 and len(pairs) < min(args.conversations, len(user_ids) * (len(user_ids) - 1) // 2):
+            a, b = rng.sample(user_ids, 2)
+            pairs.add((min(a, b), max(a, b)))
+
+        now = datetime.now(timezone.utc)
+        message_rows = []
+        for a, b in pairs:
+            started = now - timedelta(days=rng.uniform(1, 90))
+            for i in range(args.messages_per_conversation):
+                sender_id, receiver_id = (a, b) if rng.random() < 0.5 else (b, a)
+                message_rows.append({
+                    "sender_id": sender_id,
+                    "receiver_id": receiver_id,
+                    "message": " ".join(rng.choices(WORDS, k=rng.randint(3, 12))),
+                    "timestamp": started + timedelta(minutes=i * rng.uniform(1, 30)),
+                    "conversation_key": chat.conversation_key_for(a, b),
+                })
+
+        # Fresh databases only have partitions from the current month on.
+        if message_rows:
+            timestamps = [row["timestamp"] for row in message_rows]
+            for month in partitions.months_between(min(timestamps), max(timestamps)):
+                conn.execute(partitions.partition_ddl(month))
+
+        for chunk in chunked(message_rows):
+            result = conn.execute(
+                insert(models.ChatMessage).returning(
+                    models.ChatMessage.id,
+                    models.ChatMessage.sender_id,
+                    models.ChatMessage.receiver_id,
+                    models.ChatMessage.message,
+                    models.ChatMessage.timestamp,
+                    models.ChatMessage.conversation_key,
+                    sort_by_parameter_order=True,
+                ),
+                chunk,
+            )
+            conn.execute(chat.upsert_conversations(chat.conversation_summaries(result.all())))
+
+    return {
+        "users": len(user_ids),
+        "skills": len(skill_rows),
+        "wanted_skills": len(want_rows),
+        "trade_requests": len(request_rows),
+        "conversations": len(pairs),
+        "messages": len(message_rows),
+    }
+
+def main(argv=None):
+    counts = seed(parse_args(argv))
+    print(", ".join(f"{name}={count}" for name, count in counts.items()))
+
+if __name__ == "__main__":
+    main()
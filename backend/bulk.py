@@ -0,0 +1,166 @@
+import codecs
+import csv
+import io
+import json
+import os
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+
+import facets
+import models
+import suggest
+from database import read_session
+from schemas import SkillCreate
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+BULK_MAX_ERRORS = int(os.getenv("BULK_MAX_ERRORS", 100))
+# Each added line re-parses the record, so bound how far a stray quote
+# can run.
+BULK_MAX_RECORD_LINES = int(os.getenv("BULK_MAX_RECORD_LINES", 100))
+EXPORT_FIELDS = ["id", "name", "category", "description", "user_id"]
+
+FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+def detect_format(fmt: str, content_type: str):
+    if fmt:
+        return fmt if fmt in FORMATS else None
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in ("text/csv", "application/csv"):
+        return "csv"
+    if content_type in ("application/x-ndjson", "application/ndjson", "application/jsonl"):
+        return "ndjson"
+    return None
+
+async def iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending.rstrip("\r")
+
+# csv raises this when a quoted field runs past the lines it was given.
+CSV_INCOMPLETE = "unexpected end of data"
+
+async def iter_csv_rows(lines):
+    header = None
+    record, start = [], 0
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not record:
+            start = line_no
+        record.append(line + "\n")
+        # The csv module decides where a record ends; quoted fields may span
+        # several physical lines.
+        try:
+            values = next(csv.reader(record, strict=True), [])
+        except csv.Error as e:
+            if str(e) == CSV_INCOMPLETE and len(record) < BULK_MAX_RECORD_LINES:
+                continue
+            if str(e) == CSV_INCOMPLETE:
+                e = ValueError("Unterminated quoted field")
+            record = []
+            yield start, e
+            continue
+        record = []
+        if header is None:
+            header = [h.strip() for h in values]
+            continue
+        if not any(v.strip() for v in values):
+            continue
+        yield start, dict(zip(header, values))
+    if record:
+        yield start, ValueError("Unterminated quoted field")
+
+async def iter_ndjson_rows(lines):
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except ValueError as e:
+            yield line_no, e
+
+async def import_skills(db, chunks, fmt: str, user_id: int):
+    rows = iter_csv_rows(iter_lines(chunks)) if fmt == "csv" else iter_ndjson_rows(iter_lines(chunks))
+    inserted, errors, batch = 0, [], []
+
+    async def flush():
+        nonlocal inserted
+        if batch:
+            await db.execute(insert(models.Skill), batch)
+            await db.commit()
+            inserted += len(batch)
+            for row in batch:
+                suggest.index.add(row["name"], row.get("category"))
+                facets.cache.skill_added(user_id, row.get("category"))
+            batch.clear()
+
+    async for line_no, row in rows:
+        try:
+            if isinstance(row, Exception):
+                raise row
+            if not isinstance(row, dict):
+                raise ValueError("Expected an object")
+            if row.get("description") == "":
+                row["description"] = None
+            skill = SkillCreate.model_validate(row)
+        except ValidationError as e:
+            if len(errors) < BULK_MAX_ERRORS:
+                message = "; ".join(
+                    f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()
+                )
+                errors.append({"line": line_no, "error": message})
+            continue
+        except (ValueError, csv.Error) as e:
+            if len(errors) < BULK_MAX_ERRORS:
+                errors.append({"line": line_no, "error": str(e)})
+            continue
+        batch.append({**skill.model_dump(), "user_id": user_id})
+        if len(batch) >= BULK_BATCH_SIZE:
+            await flush()
+    await flush()
+
+    return {"inserted": inserted, "errors": errors}
+
+async def export_skills(fmt: str, user_id: int = None):
+    query = select(
+        models.Skill.id,
+        models.Skill.name,
+        models.Skill.category,
+        models.Skill.description,
+        models.Skill.user_id,
+    ).order_by(models.Skill.id)
+    if user_id is not None:
+        query = query.where(models.Skill.user_id == user_id)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(EXPORT_FIELDS)
+
+    async with read_session() as db:
+        result = await db.stream(query.execution_options(yield_per=BULK_BATCH_SIZE))
+        async for partition in result.partitions():
+            for row in partition:
+                if fmt == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(EXPORT_FIELDS, row))))
+                    buffer.write("\n")
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
@@ -0,0 +1,125 @@
+from fastapi import HTTPException
+from sqlalchemy import case, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import models
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def conversation_key_for(a: int, b: int):
+    return f"{min(a, b)}_{max(a, b)}"
+
+MESSAGE_COLUMNS = (
+    models.ChatMessage.id,
+    models.ChatMessage.sender_id,
+    models.ChatMessage.receiver_id,
+    models.ChatMessage.request_id,
+    models.ChatMessage.message,
+    models.ChatMessage.timestamp,
+    models.ChatMessage.conversation_key,
+)
+
+def message_payload(row):
+    return {**row._mapping, "timestamp": row.timestamp.isoformat()}
+
+async def mark_read(db, user_id: int, partner_id: int):
+    column = "unread_a" if user_id < partner_id else "unread_b"
+    await db.execute(
+        update(models.Conversation)
+        .where(models.Conversation.conversation_key == conversation_key_for(user_id, partner_id))
+        .values({column: 0})
+    )
+
+async def fetch_page(db, scope, before_id=None, after_id=None, limit=DEFAULT_PAGE_SIZE):
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    position = tuple_(models.ChatMessage.timestamp, models.ChatMessage.id)
+    query = select(*MESSAGE_COLUMNS).where(scope)
+
+    anchor_id = before_id if before_id is not None else after_id
+    if anchor_id is not None:
+        anchor = await db.execute(
+            select(models.ChatMessage.timestamp, models.ChatMessage.id)
+            .where(scope, models.ChatMessage.id == anchor_id)
+        )
+        anchor = anchor.first()
+        if not anchor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if after_id is not None:
+        query = query.where(position > tuple(anchor)).order_by(
+            models.ChatMessage.timestamp.asc(), models.ChatMessage.id.asc()
+        )
+    else:
+        if before_id is not None:
+            query = query.where(position < tuple(anchor))
+        query = query.order_by(
+            models.ChatMessage.timestamp.desc(), models.ChatMessage.id.desc()
+        )
+
+    result = await db.execute(query.limit(limit + 1))
+    msgs = result.all()
+    has_more = len(msgs) > limit
+    msgs = msgs[:limit]
+    if after_id is None:
+        msgs.reverse()
+
+    next_cursor = None
+    if has_more:
+        next_cursor = msgs[-1].id if after_id is not None else msgs[0].id
+
+    return {
+        "messages": msgs,
+        "next_cursor": next_cursor,
+    }
+
+def conversation_summaries(messages):
+    summaries = {}
+    for m in messages:
+        a, b = min(m.sender_id, m.receiver_id), max(m.sender_id, m.receiver_id)
+        s = summaries.setdefault(m.conversation_key, {
+            "conversation_key": m.conversation_key,
+            "user_a_id": a,
+            "user_b_id": b,
+            "last_message_id": None,
+            "unread_a": 0,
+            "unread_b": 0,
+        })
+        if s["last_message_id"] is None or (m.timestamp, m.id) > (s["last_message_at"], s["last_message_id"]):
+            s["last_message_id"] = m.id
+            s["last_message_text"] = m.message
+            s["last_message_at"] = m.timestamp
+            s["last_sender_id"] = m.sender_id
+        if m.receiver_id == a:
+            s["unread_a"] += 1
+        else:
+            s["unread_b"] += 1
+    return [summaries[k] for k in sorted(summaries)]
+
+def upsert_conversations(summaries):
+    conv = models.Conversation
+    stmt = pg_insert(conv).values(summaries)
+    excluded = stmt.excluded
+    newer = or_(
+        conv.last_message_id.is_(None),
+        tuple_(excluded.last_message_at, excluded.last_message_id)
+        > tuple_(conv.last_message_at, conv.last_message_id),
+    )
+
+    def latest(column):
+        return case((newer, getattr(excluded, column)), else_=getattr(conv, column))
+
+    return stmt.on_conflict_do_update(
+        index_elements=[conv.conversation_key],
+        set_={
+            "last_message_id": latest("last_message_id"),
+            "last_message_text": latest("last_message_text"),
+            "last_message_at": latest("last_message_at"),
+            "last_sender_id": latest("last_sender_id"),
+            "unread_a": conv.unread_a + excluded.unread_a,
+            "unread_b": conv.unread_b + excluded.unread_b,
+        },
+    )
@@ -0,0 +1,289 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+import chat
+import models
+import partitions
+from cache import TTLCache
+from database import async_engine
+
+CHAT_ARCHIVE_DIR = os.getenv("CHAT_ARCHIVE_DIR", "chat_archive")
+CHAT_RETENTION_MONTHS = int(os.getenv("CHAT_RETENTION_MONTHS", 12))
+CHAT_ARCHIVE_CACHE_SIZE = int(os.getenv("CHAT_ARCHIVE_CACHE_SIZE", 256))
+CHAT_ARCHIVE_BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", 5000))
+CHAT_ARCHIVE_RESCAN_SECONDS = float(os.getenv("CHAT_ARCHIVE_RESCAN_SECONDS", 60))
+
+FIELDS = [column.key for column in chat.MESSAGE_COLUMNS]
+DATA_SUFFIX = ".ndjson.gz"
+INDEX_SUFFIX = ".index.json"
+
+logger = logging.getLogger(__name__)
+
+def archive_paths(directory: str, name: str):
+    base = os.path.join(directory, name)
+    return base + DATA_SUFFIX, base + INDEX_SUFFIX
+
+def encode(row):
+    values = dict(zip(FIELDS, row))
+    values["timestamp"] = values["timestamp"].isoformat()
+    return json.dumps(values, separators=(",", ":")) + "\n"
+
+def decode(line: bytes):
+    values = json.loads(line)
+    values["timestamp"] = datetime.fromisoformat(values["timestamp"])
+    return values
+
+def _write_atomic(path: str, write):
+    with open(path + ".tmp", "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+class ArchiveWriter:
+    """Writes one month of messages as gzipped NDJSON.
+
+    Each conversation is its own gzip member (concatenated members are still
+    a valid .gz file) and the index records where each one starts, so reads
+    only inflate the conversation they need. The index is written last and
+    marks the archive as complete.
+    """
+
+    def __init__(self, directory: str, name: str):
+        os.makedirs(directory, exist_ok=True)
+        self.data_path, self.index_path = archive_paths(directory, name)
+        self.file = open(self.data_path + ".tmp", "wb")
+        self.index = {}
+        self.rows = 0
+
+    def add(self, key: str, lines):
+        blob = gzip.compress("".join(lines).encode())
+        self.index[key] = [self.file.tell(), len(blob), len(lines)]
+        self.file.write(blob)
+        self.rows += len(lines)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.data_path + ".tmp")
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.data_path + ".tmp", self.data_path)
+        _write_atomic(self.index_path, lambda f: f.write(json.dumps(self.index).encode()))
+
+async def write_archive(engine, month, directory: str):
+    name = partitions.partition_name(month)
+    writer = ArchiveWriter(directory, name)
+    try:
+        key, lines = None, []
+        async with engine.connect() as conn:
+            result = await conn.stream(
+                text(f"SELECT {', '.join(FIELDS)} FROM {name} ORDER BY conversation_key, timestamp, id")
+                .execution_options(yield_per=CHAT_ARCHIVE_BATCH_SIZE)
+            )
+            async for row in result:
+                row_key = row.conversation_key or ""
+                if row_key != key and lines:
+                    writer.add(key, lines)
+                    lines = []
+                key = row_key
+                lines.append(encode(row))
+        if lines:
+            writer.add(key, lines)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.commit()
+    return writer.rows
+
+async def archive_partition(conn, month, directory: str = CHAT_ARCHIVE_DIR, engine=async_engine):
+    """Write `month` to the archive, then detach and drop its partition.
+
+    `conn` must be in autocommit mode; the rows are streamed on a separate
+    connection because server-side cursors need a transaction.
+    """
+    name = partitions.partition_name(month)
+    rows = await write_archive(engine, month, directory)
+    await conn.execute(text(f"ALTER TABLE {partitions.PARENT} DETACH PARTITION {name} CONCURRENTLY"))
+    await conn.execute(text(f"DROP TABLE {name}"))
+    return rows
+
+async def archive_expired(retention_months: int = CHAT_RETENTION_MONTHS, directory: str = CHAT_ARCHIVE_DIR,
+                          engine=async_engine):
+    """Archive and drop every partition older than `retention_months` whole months."""
+    cutoff = partitions.add_months(partitions.current_month(), -retention_months)
+    archived = []
+    async with engine.connect() as conn:
+        # DETACH ... CONCURRENTLY cannot run inside a transaction block.
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        lock = {"key": partitions.MAINTENANCE_LOCK_KEY}
+        if not await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), lock):
+            logger.info("Chat partition maintenance already running, skipping archive")
+            return archived
+        try:
+            for month in await partitions.list_partitions(conn):
+                if month >= cutoff:
+                    break
+                rows = await archive_partition(conn, month, directory, engine)
+                logger.info("Archived %s (%d messages)", partitions.partition_name(month), rows)
+                archived.append((month, rows))
+        finally:
+            store.refresh()
+            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), lock)
+    return archived
+
+class ArchiveStore:
+    """Reads archived conversations.
+
+    The archive listing and indexes are scanned at most every
+    `rescan_seconds` (archiving usually runs in a separate process), so a
+    conversation with nothing archived is answered without touching the
+    filesystem.
+    """
+
+    def __init__(self, directory: str = CHAT_ARCHIVE_DIR, cache_size: int = CHAT_ARCHIVE_CACHE_SIZE,
+                 rescan_seconds: float = CHAT_ARCHIVE_RESCAN_SECONDS):
+        self.directory = directory
+        self.rescan_seconds = rescan_seconds
+        self.indexes = {}
+        self.archives = []
+        self.scanned_at = None
+        self.members = TTLCache(maxsize=cache_size, ttl=600)
+        self.lock = threading.Lock()
+
+    def refresh(self):
+        self.scanned_at = None
+
+    def _stale(self):
+        return self.scanned_at is None or time.monotonic() - self.scanned_at >= self.rescan_seconds
+
+    def _scan(self):
+        """Lists (name, index) for every complete archive, newest month first."""
+        with self.lock:
+            if not self._stale():
+                return
+            scanned_at = time.monotonic()
+            try:
+                names = sorted(
+                    (entry.name[:-len(INDEX_SUFFIX)] for entry in os.scandir(self.directory)
+                     if entry.name.endswith(INDEX_SUFFIX)),
+                    reverse=True,
+                )
+            except FileNotFoundError:
+                names = []
+            indexes = {}
+            for name in names:
+                _, index_path = archive_paths(self.directory, name)
+                mtime = os.stat(index_path).st_mtime
+                cached = self.indexes.get(name)
+                if cached is None or cached[0] != mtime:
+                    with open(index_path, "rb") as f:
+                        cached = (mtime, json.load(f))
+                indexes[name] = cached
+            self.indexes = indexes
+            self.archives = [(name, indexes[name][1]) for name in names]
+            self.scanned_at = scanned_at
+
+    def _messages(self, name: str, index: dict, key: str):
+        entry = index.get(key)
+        if entry is None:
+            return []
+        messages = self.members.get((name, entry[0]))
+        if messages is None:
+            data_path, _ = archive_paths(self.directory, name)
+            with open(data_path, "rb") as f:
+                f.seek(entry[0])
+                blob = f.read(entry[1])
+            messages = [decode(line) for line in gzip.decompress(blob).splitlines()]
+            self.members.set((name, entry[0]), messages)
+        return messages
+
+    def _page(self, archives, key: str, before_id, limit: int):
+        newest_first, found = [], before_id is None
+        with self.lock:
+            for name, index in archives:
+                messages = self._messages(name, index, key)
+                if not found:
+                    position = next((i for i, m in enumerate(messages) if m["id"] == before_id), None)
+                    if position is None:
+                        continue
+                    found, messages = True, messages[:position]
+                newest_first.extend(reversed(messages))
+                if len(newest_first) > limit:
+                    break
+        if not found:
+            return None
+        page = newest_first[:limit][::-1]
+        has_more = len(newest_first) > limit
+        return {"messages": page, "next_cursor": page[0]["id"] if has_more else None}
+
+    async def page(self, key: str, before_id=None, limit: int = chat.DEFAULT_PAGE_SIZE):
+        """Archived messages of a conversation older than `before_id`; None if that id is not archived."""
+        if self._stale():
+            await asyncio.to_thread(self._scan)
+        archives = self.archives
+        if not any(key in index for _, index in archives):
+            return {"messages": [], "next_cursor": None} if before_id is None else None
+        return await asyncio.to_thread(self._page, archives, key, before_id, limit)
+
+store = ArchiveStore()
+
+async def fetch_conversation_page(db, conversation_key: str, before_id=None, after_id=None,
+                                  limit: int = chat.DEFAULT_PAGE_SIZE):
+    """chat.fetch_page for one conversation that keeps paging back into the archive."""
+    limit = max(1, min(limit, chat.MAX_PAGE_SIZE))
+    scope = models.ChatMessage.conversation_key == conversation_key
+    try:
+        page = await chat.fetch_page(db, scope, before_id=before_id, after_id=after_id, limit=limit)
+    except HTTPException:
+        if before_id is None or after_id is not None:
+            raise
+        archived = await store.page(conversation_key, before_id, limit)
+        if archived is None:
+            raise
+        return archived
+
+    if after_id is not None or page["next_cursor"] is not None:
+        return page
+    # Everything left in the database fit on this page; archived months are
+    # strictly older, so continue with the newest archived messages.
+    messages = page["messages"]
+    room = limit - len(messages)
+    older = await store.page(conversation_key, None, max(room, 1))
+    if not older["messages"]:
+        return page
+    if room == 0:
+        return {"messages": messages, "next_cursor": messages[0].id}
+    return {"messages": older["messages"] + messages, "next_cursor": older["next_cursor"]}
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Create upcoming chat partitions and archive the ones past the retention window."
+    )
+    parser.add_argument("--retention-months", type=int, default=CHAT_RETENTION_MONTHS)
+    parser.add_argument("--directory", default=CHAT_ARCHIVE_DIR)
+    return parser.parse_args(argv)
+
+async def run(args):
+    created = await partitions.ensure_partitions()
+    archived = await archive_expired(args.retention_months, args.directory)
+    for month in created:
+        print(f"created {partitions.partition_name(month)}")
+    for month, rows in archived:
+        print(f"archived {partitions.partition_name(month)}: {rows} messages")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(parse_args()))
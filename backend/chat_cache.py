@@ -0,0 +1,156 @@
+import os
+import sys
+from collections import OrderedDict, deque, namedtuple
+
+import chat
+import chat_archive
+import database
+import metrics
+from cache import TTLCache
+from realtime import SOCKETIO_MESSAGE_QUEUE
+
+# Buffers must hold more than one page so a full first page can be told
+# apart from the whole conversation.
+HOT_CHAT_MESSAGES = int(os.getenv("HOT_CHAT_MESSAGES", 64))
+HOT_CHAT_MAX_BYTES = int(os.getenv("HOT_CHAT_MAX_BYTES", 32 * 1024 * 1024))
+# Each worker only sees its own writes, so the cache is off by default once
+# sockets are spread over several workers.
+HOT_CHAT_ENABLED = os.getenv(
+    "HOT_CHAT_ENABLED", "false" if SOCKETIO_MESSAGE_QUEUE else "true"
+).lower() not in ("0", "false", "no")
+
+FIELDS = [column.key for column in chat.MESSAGE_COLUMNS]
+Message = namedtuple("Message", FIELDS)
+MESSAGE_OVERHEAD = sys.getsizeof(Message(*FIELDS)) + 160
+
+def to_message(m):
+    return Message(**m) if isinstance(m, dict) else Message(*m)
+
+def message_size(m: Message):
+    return MESSAGE_OVERHEAD + len(m.message)
+
+class ConversationBuffer:
+    __slots__ = ("messages", "complete", "nbytes", "written_at")
+
+    def __init__(self, messages, complete: bool, capacity: int, written_at: int = 0):
+        self.messages = deque(messages, maxlen=capacity)
+        self.complete = complete
+        self.nbytes = sum(map(message_size, self.messages))
+        self.written_at = written_at
+
+    def append(self, message: Message):
+        last = self.messages[-1] if self.messages else None
+        if last is not None and (message.timestamp, message.id) < (last.timestamp, last.id):
+            return False
+        if len(self.messages) == self.messages.maxlen:
+            self.complete = False
+            self.nbytes -= message_size(self.messages[0])
+        self.messages.append(message)
+        self.nbytes += message_size(message)
+        return True
+
+class HotConversations:
+    """The newest messages of recently active conversations.
+
+    Buffers are filled by the chat writer and by first-page reads, and the
+    least recently used ones are dropped once HOT_CHAT_MAX_BYTES is reached.
+    """
+
+    def __init__(self, capacity: int = HOT_CHAT_MESSAGES, max_bytes: int = HOT_CHAT_MAX_BYTES,
+                 enabled: bool = HOT_CHAT_ENABLED):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.buffers = OrderedDict()
+        self.nbytes = 0
+        # Reads that may not have seen the latest write must not replace
+        # what the writer put in the buffer: on the primary that is a read
+        # that started before the write, on a replica anything inside the
+        # read-your-writes window.
+        self.clock = 0
+        self.recent_writes = TTLCache(
+            maxsize=100000, ttl=database.READ_YOUR_WRITES_SECONDS if database.read_engines else 0
+        )
+
+    def page(self, key: str, limit: int):
+        buffer = self.buffers.get(key)
+        if buffer is None or (len(buffer.messages) <= limit and not buffer.complete):
+            return None
+        self.buffers.move_to_end(key)
+        return page_of(list(buffer.messages), limit, buffer.complete)
+
+    def record_writes(self, rows):
+        if not self.enabled:
+            return
+        self.clock += 1
+        for row in rows:
+            message = to_message(row)
+            key = message.conversation_key
+            self.recent_writes.set(key, True)
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                self._store(key, ConversationBuffer([message], False, self.capacity, self.clock))
+                continue
+            self.nbytes -= buffer.nbytes
+            if buffer.append(message):
+                buffer.written_at = self.clock
+                self.nbytes += buffer.nbytes
+                self.buffers.move_to_end(key)
+            else:
+                del self.buffers[key]
+        self._evict()
+
+    def remember(self, key: str, messages, complete: bool, read_at: int):
+        if not self.enabled or key in self.recent_writes:
+            return
+        buffer = self.buffers.get(key)
+        if buffer is not None and buffer.written_at > read_at:
+            return
+        self._store(key, ConversationBuffer(messages[-self.capacity:], complete, self.capacity))
+        self._evict()
+
+    def _store(self, key: str, buffer: ConversationBuffer):
+        previous = self.buffers.pop(key, None)
+        if previous is not None:
+            self.nbytes -= previous.nbytes
+        self.buffers[key] = buffer
+        self.nbytes += buffer.nbytes
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and self.buffers:
+            _, buffer = self.buffers.popitem(last=False)
+            self.nbytes -= buffer.nbytes
+
+    def clear(self):
+        self.buffers.clear()
+        self.nbytes = 0
+
+conversations = HotConversations()
+
+def page_of(messages, limit: int, complete: bool):
+    if len(messages) > limit:
+        messages = messages[-limit:]
+        return {"messages": messages, "next_cursor": messages[0].id}
+    return {"messages": messages, "next_cursor": None if complete else messages[0].id}
+
+async def first_page(db, key: str, limit: int = chat.DEFAULT_PAGE_SIZE):
+    """Newest page of a conversation, from its buffer when there is one."""
+    limit = max(1, min(limit, chat.MAX_PAGE_SIZE))
+    if not conversations.enabled or limit >= conversations.capacity:
+        return await chat_archive.fetch_conversation_page(db, key, limit=limit)
+
+    cached = conversations.page(key, limit)
+    metrics.HOT_CHAT_READS.labels("hit" if cached is not None else "miss").inc()
+    if cached is not None:
+        return cached
+
+    read_at = conversations.clock
+    page = await chat_archive.fetch_conversation_page(db, key, limit=conversations.capacity)
+    messages = [to_message(m) for m in page["messages"]]
+    complete = page["next_cursor"] is None
+    conversations.remember(key, messages, complete, read_at)
+    if not messages:
+        return page
+    if len(messages) > limit:
+        return page_of(messages, limit, complete)
+    return {"messages": messages, "next_cursor": page["next_cursor"]}
@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import os
+
+from sqlalchemy import insert
+
+import chat
+import chat_cache
+import models
+from database import AsyncSessionLocal
+
+CHAT_BATCH_SIZE = int(os.getenv("CHAT_BATCH_SIZE", 256))
+CHAT_BATCH_MAX_DELAY_MS = float(os.getenv("CHAT_BATCH_MAX_DELAY_MS", 5))
+
+# Queued by stop(); everything submitted before it is flushed first.
+STOP = object()
+
+logger = logging.getLogger(__name__)
+
+class MessageBatcher:
+    def __init__(self, session_factory=AsyncSessionLocal,
+                 max_batch: int = CHAT_BATCH_SIZE, max_delay_ms: float = CHAT_BATCH_MAX_DELAY_MS):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.queue.put_nowait(STOP)
+        await self.task
+        self.task = None
+        # Messages submitted while stopping landed behind the sentinel.
+        while self.queue.qsize():
+            pending = []
+            self._drain(pending)
+            if pending:
+                await self._flush(pending)
+
+    async def submit(self, values: dict):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((values, future))
+        return await future
+
+    def _drain(self, batch):
+        """Move queued items into `batch`; True once STOP is reached."""
+        while len(batch) < self.max_batch:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return False
+            if item is STOP:
+                return True
+            batch.append(item)
+        return False
+
+    async def _collect(self):
+        item = await self.queue.get()
+        if item is STOP:
+            return [], True
+        batch = [item]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if self._drain(batch):
+                return batch, True
+            timeout = deadline - loop.time()
+            if len(batch) >= self.max_batch or timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    async def _run(self):
+        while True:
+            batch, stopping = await self._collect()
+            if batch:
+                await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch):
+        try:
+            rows = await self._persist([values for values, _ in batch])
+        except Exception:
+            if len(batch) == 1:
+                logger.exception("Failed to persist chat message")
+                rows = None
+            else:
+                # Isolate the offending message(s) so one bad row does not
+                # fail every message that happened to share its batch.
+                for item in batch:
+                    await self._flush([item])
+                return
+
+        if rows is not None:
+            # Outside the retry above: the rows are committed by now.
+            try:
+                chat_cache.conversations.record_writes(rows)
+            except Exception:
+                logger.exception("Failed to update hot conversations")
+                chat_cache.conversations.clear()
+
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue
+            if rows is None:
+                future.set_exception(RuntimeError("Message could not be saved"))
+            else:
+                future.set_result(rows[i])
+
+    async def _persist(self, values):
+        async with self.session_factory() as db:
+            result = await db.execute(
+                insert(models.ChatMessage).returning(
+                    *chat.MESSAGE_COLUMNS, sort_by_parameter_order=True
+                ),
+                values,
+            )
+            rows = result.all()
+            await db.execute(chat.upsert_conversations(chat.conversation_summaries(rows)))
+            await db.commit()
+        return rows
+
+batcher = MessageBatcher()
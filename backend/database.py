@@ -1,17 +1,80 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+import itertools
 import os
 
+import metrics
+from cache import TTLCache
+
 DATABASE_URL = os.getenv(
     "DATABASE_URL",
     "postgresql://user:password@db:5432/database"
 )
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True)
+def to_async_url(url: str):
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return make_url(url).set(drivername="postgresql+asyncpg")
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+DATABASE_READ_URLS = [u.strip() for u in os.getenv("DATABASE_READ_URLS", "").split(",") if u.strip()]
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+def pool_options(prefix: str):
+    return {
+        "pool_pre_ping": True,
+        "pool_size": int(os.getenv(f"{prefix}_POOL_SIZE", 5)),
+        "max_overflow": int(os.getenv(f"{prefix}_MAX_OVERFLOW", 10)),
+        "pool_timeout": float(os.getenv(f"{prefix}_POOL_TIMEOUT", 30)),
+        "pool_recycle": int(os.getenv(f"{prefix}_POOL_RECYCLE", -1)),
+    }
+
+engine = create_engine(
+    DATABASE_URL, poolclass=metrics.instrumented_pool("sync", is_async=False), **pool_options("DB")
+)
+metrics.instrument_engine(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL, poolclass=metrics.instrumented_pool("primary"), **pool_options("DB")
+)
+metrics.instrument_engine(async_engine.sync_engine, "primary")
+
+read_engines = []
+for i, url in enumerate(DATABASE_READ_URLS):
+    name = f"replica-{i}"
+    read_engine = create_async_engine(
+        to_async_url(url), poolclass=metrics.instrumented_pool(name), **pool_options("DB_READ")
+    )
+    metrics.instrument_engine(read_engine.sync_engine, name)
+    read_engines.append(read_engine)
+
+_next_read_engine = itertools.cycle(read_engines or [async_engine])
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Users who wrote recently read from the primary until replicas have had
+# time to catch up with their own changes.
+recent_writers = TTLCache(maxsize=100000, ttl=READ_YOUR_WRITES_SECONDS)
+
+def mark_write(user_id: int):
+    recent_writers.set(user_id, True)
+
+def wrote_recently(user_id: int):
+    return user_id in recent_writers
+
+def read_session(primary: bool = False):
+    return AsyncSessionLocal(bind=async_engine if primary else next(_next_read_engine))
+
 Base = declarative_base()
 
 def get_db():
@@ -20,3 +83,7 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
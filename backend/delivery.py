@@ -0,0 +1,132 @@
+import logging
+import os
+
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+import chat
+import models
+import realtime
+from database import AsyncSessionLocal
+from tasks import PeriodicTask
+
+DELIVERY_BATCH_SIZE = int(os.getenv("DELIVERY_BATCH_SIZE", 200))
+DELIVERY_FLUSH_MS = float(os.getenv("DELIVERY_FLUSH_MS", 1000))
+
+logger = logging.getLogger(__name__)
+
+class DeliveryTracker:
+    """Per-user cursor of the last received message a client acknowledged.
+
+    Acks are coalesced in memory and written in one upsert per flush; a
+    lost flush only means those messages are offered again on reconnect.
+    Read acks are coalesced the same way, per conversation, and the
+    partner hears about them after the flush.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal,
+                 batch_size: int = DELIVERY_BATCH_SIZE, flush_ms: float = DELIVERY_FLUSH_MS):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+        self.pending = {}
+        self.reads = set()
+        self.sio = None
+        self.flusher = PeriodicTask("Delivery flush", self.flush, self.flush_interval, delay_first=True)
+
+    def start(self, sio=None):
+        if sio is not None:
+            self.sio = sio
+        self.flusher.start()
+
+    async def stop(self):
+        await self.flusher.stop()
+        await self.flush()
+
+    def ack(self, user_id: int, message_id: int):
+        if message_id > self.pending.get(user_id, 0):
+            self.pending[user_id] = message_id
+            self.start()
+
+    def read(self, user_id: int, partner_id: int):
+        self.reads.add((user_id, partner_id))
+        self.start()
+
+    async def flush(self):
+        await self._flush_reads()
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, {}
+        state = models.DeliveryState
+        stmt = pg_insert(state).values([
+            {"user_id": user_id, "last_delivered_id": message_id}
+            for user_id, message_id in sorted(pending.items())
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[state.user_id],
+            set_={
+                "last_delivered_id": func.greatest(
+                    state.last_delivered_id, stmt.excluded.last_delivered_id
+                ),
+                "updated_at": func.now(),
+            },
+        )
+        try:
+            async with self.session_factory() as db:
+                await db.execute(stmt)
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to persist %d delivery cursors", len(pending))
+
+    async def _flush_reads(self):
+        if not self.reads:
+            return
+        reads, self.reads = self.reads, set()
+        table = models.Conversation.__table__
+        columns = {"unread_a": [], "unread_b": []}
+        for user_id, partner_id in sorted(reads):
+            column = "unread_a" if user_id < partner_id else "unread_b"
+            columns[column].append({"key": chat.conversation_key_for(user_id, partner_id)})
+        try:
+            async with self.session_factory() as db:
+                for column, keys in columns.items():
+                    if keys:
+                        await db.execute(
+                            update(table).where(table.c.conversation_key == bindparam("key"))
+                            .values({column: 0}),
+                            keys,
+                        )
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to persist %d read acks", len(reads))
+            return
+        if self.sio is None:
+            return
+        for user_id, partner_id in reads:
+            await self.sio.emit("messages_read", {
+                "conversation_key": chat.conversation_key_for(user_id, partner_id),
+                "reader_id": user_id,
+            }, room=realtime.user_room(partner_id))
+
+    async def undelivered(self, user_id: int, after: int = None):
+        """Next batch of messages for `user_id` past `after` (default: the stored cursor)."""
+        async with self.session_factory() as db:
+            if after is None:
+                stored = await db.scalar(
+                    select(models.DeliveryState.last_delivered_id)
+                    .where(models.DeliveryState.user_id == user_id)
+                )
+                after = max(stored or 0, self.pending.get(user_id, 0))
+            result = await db.execute(
+                select(*chat.MESSAGE_COLUMNS)
+                .where(
+                    models.ChatMessage.receiver_id == user_id,
+                    models.ChatMessage.id > after,
+                )
+                .order_by(models.ChatMessage.id)
+                .limit(self.batch_size + 1)
+            )
+            rows = result.all()
+        return rows[:self.batch_size], len(rows) > self.batch_size
+
+tracker = DeliveryTracker()
@@ -0,0 +1,176 @@
+import os
+
+from sqlalchemy import func, literal_column, select
+
+import models
+import search
+from cache import TTLCache
+from database import read_session
+
+FACET_CACHE_SIZE = int(os.getenv("FACET_CACHE_SIZE", 2048))
+FACET_CACHE_TTL = float(os.getenv("FACET_CACHE_TTL", 300))
+FACET_QUERY_TTL = float(os.getenv("FACET_QUERY_TTL", 30))
+
+FIELDS = ("category", "owner")
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# Owners kept for the unfiltered facet; a user dropping out of it can only
+# be noticed by reloading, so keep a margin over MAX_LIMIT.
+OWNER_TOP = MAX_LIMIT + 20
+
+category_key = func.lower(models.Skill.category)
+
+def parse_fields(spec: str):
+    fields = [field.strip() for field in spec.split(",") if field.strip()]
+    return [field for field in FIELDS if field in fields], set(fields) - set(FIELDS)
+
+def category_counts(query):
+    return (
+        query.add_columns(category_key, func.min(models.Skill.category), func.count())
+        .where(models.Skill.category.is_not(None), models.Skill.category != "")
+        .group_by(category_key)
+    )
+
+def owner_counts(query, limit: int):
+    count = func.count()
+    return (
+        query.add_columns(models.Skill.user_id, models.User.username, count)
+        .join(models.User, models.User.id == models.Skill.user_id)
+        .group_by(models.Skill.user_id, models.User.username)
+        .order_by(count.desc(), models.Skill.user_id)
+        .limit(limit)
+    )
+
+def sorted_categories(counts: dict):
+    return sorted(
+        ({"name": label, "count": count} for label, count in counts.values() if count > 0),
+        key=lambda c: (-c["count"], c["name"].lower()),
+    )
+
+class FacetCache:
+    """Facet counts for /search.
+
+    Totals over the whole table (what a category sidebar needs) are loaded
+    from the primary, cached and adjusted in place on skill writes; the
+    caller's own skills, which search never returns, are counted separately
+    per user and subtracted.
+    Facets of a text query are cached per user for FACET_QUERY_TTL.
+    """
+
+    def __init__(self, maxsize: int = FACET_CACHE_SIZE, ttl: float = FACET_CACHE_TTL,
+                 query_ttl: float = FACET_QUERY_TTL):
+        self.totals = TTLCache(maxsize=2, ttl=ttl)
+        self.own = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.queries = TTLCache(maxsize=maxsize, ttl=query_ttl)
+        self.version = 0
+
+    async def _total(self, name: str, load):
+        value = self.totals.get(name)
+        if value is None:
+            version = self.version
+            value = await load()
+            # A write during the load may or may not be in the result.
+            if version == self.version:
+                self.totals.set(name, value)
+        return value
+
+    async def categories(self):
+        async def load():
+            async with read_session(primary=True) as db:
+                result = await db.execute(category_counts(select()))
+                return {key: [label, count] for key, label, count in result}
+        return await self._total("categories", load)
+
+    async def owners(self):
+        async def load():
+            async with read_session(primary=True) as db:
+                result = await db.execute(owner_counts(select(), OWNER_TOP))
+                return [list(row) for row in result]
+        return await self._total("owners", load)
+
+    async def own_categories(self, db, user_id: int):
+        counts = self.own.get(user_id)
+        if counts is None:
+            result = await db.execute(
+                category_counts(select()).where(models.Skill.user_id == user_id)
+            )
+            counts = {key: count for key, _, count in result}
+            self.own.set(user_id, counts)
+        return counts
+
+    def skill_added(self, user_id: int, category: str):
+        self._adjust(user_id, category, 1)
+
+    def skill_removed(self, user_id: int, category: str):
+        self._adjust(user_id, category, -1)
+
+    def _adjust(self, user_id: int, category: str, delta: int):
+        self.version += 1
+        self.own.pop(user_id)
+        categories = self.totals.get("categories")
+        if categories is not None and category:
+            entry = categories.setdefault(category.lower(), [category, 0])
+            entry[1] += delta
+        owners = self.totals.get("owners")
+        if owners is not None:
+            entry = next((o for o in owners if o[0] == user_id), None)
+            if entry is None:
+                # Unknown total for this owner; it may now belong in the list.
+                self.totals.pop("owners")
+            else:
+                entry[2] += delta
+                owners.sort(key=lambda o: (-o[2], o[0]))
+
+cache = FacetCache()
+
+async def facet_counts(db, user_id: int, fields, q: str = "", category: str = "",
+                       limit: int = DEFAULT_LIMIT):
+    """Counts of the skills /search would return for `q`, by category and
+    by owner. Category counts ignore the `category` filter so every choice
+    stays visible; owner counts apply it."""
+    limit = max(1, min(limit, MAX_LIMIT))
+    tsquery = search.build_tsquery(q)
+    category = category.strip().lower()
+    facets = {}
+
+    if "category" in fields:
+        if tsquery is None:
+            totals = await cache.categories()
+            own = await cache.own_categories(db, user_id)
+            counts = {key: [label, count - own.get(key, 0)] for key, (label, count) in totals.items()}
+        else:
+            counts = await _query_facet(db, user_id, "category", tsquery, None, limit)
+        facets["categories"] = sorted_categories(counts)[:limit]
+
+    if "owner" in fields:
+        if tsquery is None and not category:
+            owners = await cache.owners()
+        else:
+            owners = await _query_facet(db, user_id, "owner", tsquery, category, limit)
+        facets["owners"] = [
+            {"user_id": owner, "username": username, "count": count}
+            for owner, username, count in owners
+            if owner != user_id and count > 0
+        ][:limit]
+
+    return facets
+
+async def _query_facet(db, user_id: int, field: str, tsquery, category, limit: int):
+    key = (user_id, field, tsquery, category, limit)
+    value = cache.queries.get(key)
+    if value is not None:
+        return value
+    query = select().select_from(models.Skill).where(models.Skill.user_id != user_id)
+    if tsquery is not None:
+        match = func.to_tsquery(literal_column("'simple'"), tsquery)
+        query = query.where(search.search_document.op("@@")(match))
+    if category:
+        query = query.where(category_key == category)
+    if field == "category":
+        result = await db.execute(category_counts(query))
+        value = {key: [label, count] for key, label, count in result}
+    else:
+        result = await db.execute(owner_counts(query, limit))
+        value = [list(row) for row in result]
+    cache.queries.set(key, value)
+    return value
@@ -1,23 +1,68 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request, Response
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session, joinedload
-from passlib.context import CryptContext
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from sqlalchemy import case, delete, event, func, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from auth import create_access_token, verify_access_token
+from cache import TTLCache
+from contextlib import asynccontextmanager
+from typing import List, NamedTuple, Optional
 import os
 
-from database import Base, engine, get_db, SessionLocal
+from database import get_async_db
+import database
+import bulk
+import chat
+import chat_archive
+import chat_cache
+import chat_writer
+import delivery
+import facets
+import matching
+import metrics
 import models
+import partitions
+import passwords
+import presence
+import profiles
+import ratelimit
+import search
+import suggest
+import trades
 from schemas import (
-    UserCreate, UserLogin,
-    SkillCreate, SkillUpdate,
-    TradeRequestCreate
+    UserCreate, UserLogin, UserResponse, UserProfileResponse,
+    SkillCreate, SkillUpdate, SkillResponse, SkillSearchPage, SearchFacets, SuggestionPage,
+    WantedSkillCreate, WantedSkillResponse, MatchPage,
+    TradeRequestCreate, TradeRequestResponse, TradeRequestList, TradeRequestCounts,
+    ChatMessagePage, ConversationPage, PresencePage,
 )
 
-app = FastAPI(title="Skill Barter API", version="1.0.0")
-Base.metadata.create_all(bind=engine)
+PERIODIC_TASKS = [matching.index.updater, suggest.index.rebuilder, partitions.maintainer]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    realtime.start(sio)
+    for task in PERIODIC_TASKS:
+        task.start()
+    yield
+    for task in PERIODIC_TASKS:
+        await task.stop()
+    await chat_writer.batcher.stop()
+    await delivery.tracker.stop()
+    await presence.registry.stop()
+    passwords.shutdown()
+
+app = FastAPI(
+    title="Skill Barter API",
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 allowed = os.getenv("FRONTEND_URL", "http://localhost:3000")
+# Added before CORS so 429 responses still carry the CORS headers.
+app.add_middleware(ratelimit.RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[allowed],
@@ -25,360 +70,534 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+class Principal(NamedTuple):
+    id: int
+    username: str
+    email: str
+
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("PRINCIPAL_CACHE_TTL", 60)),
+)
+
+def invalidate_user(user_id: int):
+    principal_cache.pop(user_id)
+    profiles.cache.invalidate(user_id)
 
-def get_current_user(
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_user_on_change(mapper, connection, target):
+    invalidate_user(target.id)
+
+async def get_current_user_id(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
 ):
-    token = credentials.credentials
-    user_id = verify_access_token(token)
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
+    user_id = verify_access_token(credentials.credentials)
+    yield user_id
+    if request.method not in READ_METHODS:
+        database.mark_write(user_id)
+
+async def get_read_db(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    primary = False
+    if credentials:
+        try:
+            primary = database.wrote_recently(verify_access_token(credentials.credentials))
+        except HTTPException:
+            pass
+    async with database.read_session(primary) as db:
+        yield db
+
+async def get_current_user(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_async_db)
+):
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    result = await db.execute(
+        select(models.User.id, models.User.username, models.User.email)
+        .where(models.User.id == user_id)
+    )
+    row = result.first()
+    if not row:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    principal = Principal(*row)
+    principal_cache.set(user_id, principal)
+    return principal
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.post("/register")
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    if db.query(models.User).filter(models.User.email == user.email).first():
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    existing = await db.execute(select(models.User.id).where(models.User.email == user.email))
+    if existing.first():
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_pw = pwd_context.hash(user.password)
+    hashed_pw = await passwords.hash_password(user.password)
     db_user = models.User(username=user.username, email=user.email, password=hashed_pw)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return {"message": "User registered successfully", "user": db_user.username}
 
 @app.post("/login")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
-    if not db_user or not pwd_context.verify(user.password, db_user.password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    db_user = result.scalars().first()
+    if not db_user:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
+    valid, new_hash = await passwords.verify_password(user.password, db_user.password)
+    if not valid:
         raise HTTPException(status_code=400, detail="Invalid credentials")
+    if new_hash:
+        db_user.password = new_hash
+        await db.commit()
     token = create_access_token(db_user.id)
     return {"token": token}
 
-@app.get("/profile")
-def profile(current_user: models.User = Depends(get_current_user)):
+@app.get("/profile", response_model=UserResponse)
+async def profile(current_user: Principal = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "username": current_user.username,
         "email": current_user.email,
     }
 
-@app.post("/skills")
-def add_skill(skill: SkillCreate, db: Session = Depends(get_db),
-              current_user: models.User = Depends(get_current_user)):
+@app.post("/skills", response_model=SkillResponse)
+async def add_skill(skill: SkillCreate, db: AsyncSession = Depends(get_async_db),
+                    current_user_id: int = Depends(get_current_user_id)):
     s = models.Skill(
         name=skill.name,
         description=skill.description,
         category=skill.category,
-        user_id=current_user.id
+        user_id=current_user_id
     )
     db.add(s)
-    db.commit()
-    db.refresh(s)
+    await db.commit()
+    await db.refresh(s)
+    profiles.cache.invalidate(current_user_id)
+    matching.index.mark_dirty(current_user_id)
+    suggest.index.add(s.name, s.category)
+    facets.cache.skill_added(current_user_id, s.category)
     return s
 
-@app.get("/skills")
-def get_skills(db: Session = Depends(get_db),
-               current_user: models.User = Depends(get_current_user)):
-    return db.query(models.Skill).filter(models.Skill.user_id == current_user.id).all()
-
-@app.get("/users/me")
-def get_my_profile(db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
-    user = (
-        db.query(models.User)
-        .options(joinedload(models.User.skills))
-        .filter(models.User.id == current_user.id)
-        .first()
+@app.get("/skills", response_model=List[SkillResponse])
+async def get_skills(db: AsyncSession = Depends(get_read_db),
+                     current_user_id: int = Depends(get_current_user_id)):
+    result = await db.execute(
+        select(
+            models.Skill.id,
+            models.Skill.name,
+            models.Skill.category,
+            models.Skill.description,
+            models.Skill.user_id,
+        ).where(models.Skill.user_id == current_user_id)
     )
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    return result.all()
+
+@app.post("/skills/import")
+async def import_skills(request: Request, format: str = "",
+                        db: AsyncSession = Depends(get_async_db),
+                        current_user_id: int = Depends(get_current_user_id)):
+    fmt = bulk.detect_format(format, request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=415, detail="Upload text/csv or application/x-ndjson")
+    result = await bulk.import_skills(db, request.stream(), fmt, current_user_id)
+    if result["inserted"]:
+        profiles.cache.invalidate(current_user_id)
+        matching.index.mark_dirty(current_user_id)
+    return result
+
+@app.get("/skills/export")
+async def export_skills(format: str = "ndjson", user_id: Optional[int] = None,
+                        current_user_id: int = Depends(get_current_user_id)):
+    if format not in bulk.FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported export format")
+    return StreamingResponse(
+        bulk.export_skills(format, user_id),
+        media_type=bulk.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="skills.{format}"'},
+    )
+
+@app.post("/wants", response_model=WantedSkillResponse)
+async def add_wanted_skill(want: WantedSkillCreate, db: AsyncSession = Depends(get_async_db),
+                           current_user_id: int = Depends(get_current_user_id)):
+    w = models.WantedSkill(name=want.name, category=want.category, user_id=current_user_id)
+    db.add(w)
+    await db.commit()
+    await db.refresh(w)
+    matching.index.mark_dirty(current_user_id)
+    return w
+
+@app.get("/wants", response_model=List[WantedSkillResponse])
+async def get_wanted_skills(db: AsyncSession = Depends(get_read_db),
+                            current_user_id: int = Depends(get_current_user_id)):
+    result = await db.execute(
+        select(
+            models.WantedSkill.id,
+            models.WantedSkill.name,
+            models.WantedSkill.category,
+            models.WantedSkill.user_id,
+        ).where(models.WantedSkill.user_id == current_user_id)
+    )
+    return result.all()
+
+@app.delete("/wants/{want_id}")
+async def delete_wanted_skill(want_id: int, db: AsyncSession = Depends(get_async_db),
+                              current_user_id: int = Depends(get_current_user_id)):
+    result = await db.execute(
+        delete(models.WantedSkill).where(
+            models.WantedSkill.id == want_id,
+            models.WantedSkill.user_id == current_user_id,
+        )
+    )
+    if not result.rowcount:
+        raise HTTPException(status_code=404, detail="Wanted skill not found")
+    await db.commit()
+    matching.index.mark_dirty(current_user_id)
+    return {"status": "deleted"}
+
+@app.get("/matches", response_model=MatchPage)
+async def get_matches(cursor: int = 0, limit: int = matching.DEFAULT_LIMIT,
+                      db: AsyncSession = Depends(get_read_db),
+                      current_user_id: int = Depends(get_current_user_id)):
+    limit = max(1, min(limit, matching.MAX_LIMIT))
+    page, next_cursor = matching.index.page(current_user_id, max(cursor, 0), limit)
+    usernames = {}
+    if page:
+        result = await db.execute(
+            select(models.User.id, models.User.username)
+            .where(models.User.id.in_([partner for partner, _ in page]))
+        )
+        usernames = dict(result.all())
     return {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "skills": [
-            {
-                "id": s.id,
-                "name": s.name,
-                "category": s.category,
-                "description": s.description,
-            }
-            for s in user.skills
+        "items": [
+            {"user_id": partner, "username": usernames[partner], "score": round(score, 4)}
+            for partner, score in page
+            if partner in usernames
         ],
+        "next_cursor": next_cursor,
+        "ready": matching.index.ready,
     }
 
-@app.get("/users/{user_id}")
-def get_user_profile(user_id: int, db: Session = Depends(get_db)):
-    user = (
-        db.query(models.User)
-        .options(joinedload(models.User.skills))
-        .filter(models.User.id == user_id)
-        .first()
-    )
-    if not user:
+@app.get("/users/me", response_model=UserProfileResponse)
+async def get_my_profile(request: Request,
+                         db: AsyncSession = Depends(get_read_db),
+                         current_user_id: int = Depends(get_current_user_id)):
+    entry = await profiles.load_profile(db, current_user_id)
+    if entry is None:
         raise HTTPException(status_code=404, detail="User not found")
+    return profiles.profile_response(request, entry, profiles.PRIVATE_CACHE_CONTROL)
+
+@app.get("/users/{user_id}", response_model=UserProfileResponse)
+async def get_user_profile(user_id: int, request: Request,
+                           db: AsyncSession = Depends(get_read_db)):
+    entry = await profiles.load_profile(db, user_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return profiles.profile_response(request, entry, profiles.PUBLIC_CACHE_CONTROL)
+
+@app.get("/search", response_model=SkillSearchPage)
+async def search_skills(
+    q: str = "",
+    category: str = "",
+    cursor: str = "",
+    limit: int = search.DEFAULT_LIMIT,
+    facet: str = "",
+    db: AsyncSession = Depends(get_read_db),
+    current_user_id: int = Depends(get_current_user_id)
+):
+    limit = search.clamp_limit(limit)
+    fields = parse_facet_fields(facet)
+    query = (
+        select(
+            models.Skill.id,
+            models.Skill.name,
+            models.Skill.description,
+            models.Skill.category,
+            models.Skill.user_id,
+            models.User.username,
+            models.User.email,
+        )
+        .outerjoin(models.User, models.User.id == models.Skill.user_id)
+        .where(models.Skill.user_id != current_user_id)
+    )
+    query, ranked = search.apply_search(query, q, category, cursor, limit)
+    result = await db.execute(query)
+    rows = result.all()
     return {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "skills": [
+        "items": [
             {
                 "id": s.id,
                 "name": s.name,
-                "category": s.category,
                 "description": s.description,
+                "category": s.category,
+                "owner": {
+                    "id": s.user_id,
+                    "username": s.username,
+                    "email": s.email,
+                },
             }
-            for s in user.skills
+            for s in rows[:limit]
         ],
+        "next_cursor": search.next_cursor(rows, limit, ranked),
+        "facets": (
+            await facets.facet_counts(db, current_user_id, fields, q, category)
+            if fields and not cursor else None
+        ),
     }
 
-@app.get("/search")
-def search_skills(
+def parse_facet_fields(facet: str):
+    fields, unknown = facets.parse_fields(facet)
+    if unknown:
+        raise HTTPException(status_code=400, detail="facet must be category and/or owner")
+    return fields
+
+@app.get("/search/facets", response_model=SearchFacets)
+async def search_facets(
     q: str = "",
     category: str = "",
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    facet: str = "category",
+    limit: int = facets.DEFAULT_LIMIT,
+    db: AsyncSession = Depends(get_read_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    query = (
-        db.query(models.Skill)
-        .options(joinedload(models.Skill.owner))
-        .filter(models.Skill.user_id != current_user.id)
-    )
-    if q:
-        query = query.filter(models.Skill.name.ilike(f"%{q}%"))
-    if category:
-        query = query.filter(models.Skill.category.ilike(f"%{category}%"))
-    skills = query.all()
-    return [
-        {
-            "id": s.id,
-            "name": s.name,
-            "description": s.description,
-            "category": s.category,
-            "owner": {
-                "id": s.owner.id if s.owner else s.user_id,
-                "username": s.owner.username if s.owner else None,
-                "email": s.owner.email if s.owner else None,
-            },
-        }
-        for s in skills
-    ]
+    fields = parse_facet_fields(facet)
+    return await facets.facet_counts(db, current_user_id, fields, q, category, limit)
+
+@app.get("/search/suggest", response_model=SuggestionPage)
+async def suggest_skills(q: str = "", kind: str = "", limit: int = suggest.DEFAULT_LIMIT,
+                         current_user_id: int = Depends(get_current_user_id)):
+    if kind and kind not in suggest.KINDS:
+        raise HTTPException(status_code=400, detail="kind must be skill or category")
+    limit = max(1, min(limit, suggest.MAX_LIMIT))
+    return {"items": suggest.index.suggest(q, kind or None, limit), "ready": suggest.index.ready}
 
 @app.post("/trade/request")
-def send_trade_request(req: TradeRequestCreate, db: Session = Depends(get_db),
-                       current_user: models.User = Depends(get_current_user)):
-    if current_user.id == req.receiver_id:
+async def send_trade_request(req: TradeRequestCreate, db: AsyncSession = Depends(get_async_db),
+                             current_user_id: int = Depends(get_current_user_id)):
+    if current_user_id == req.receiver_id:
         raise HTTPException(status_code=400, detail="Cannot send trade request to yourself")
-    skill = db.query(models.Skill).filter(models.Skill.id == req.skill_id).first()
+    skill = await db.get(models.Skill, req.skill_id)
     if not skill:
         raise HTTPException(status_code=404, detail="Skill not found")
     if skill.user_id != req.receiver_id:
         raise HTTPException(status_code=400, detail="Receiver ID mismatch")
     trade = models.TradeRequest(
-        sender_id=current_user.id,
+        sender_id=current_user_id,
         receiver_id=req.receiver_id,
         skill_id=req.skill_id,
         status="pending"
     )
     db.add(trade)
-    db.commit()
-    db.refresh(trade)
+    await db.commit()
+    await db.refresh(trade)
     return {"message": "Trade request sent", "request_id": trade.id}
 
-@app.get("/trade/requests")
-def get_trade_requests(db: Session = Depends(get_db),
-                       current_user: models.User = Depends(get_current_user)):
-    received = (
-        db.query(models.TradeRequest)
-        .options(
-            joinedload(models.TradeRequest.skill),
-            joinedload(models.TradeRequest.sender),
-            joinedload(models.TradeRequest.receiver),
-        )
-        .filter(models.TradeRequest.receiver_id == current_user.id)
-        .all()
-    )
-    sent = (
-        db.query(models.TradeRequest)
-        .options(
-            joinedload(models.TradeRequest.skill),
-            joinedload(models.TradeRequest.sender),
-            joinedload(models.TradeRequest.receiver),
+@app.get("/trade/requests", response_model=TradeRequestList)
+async def get_trade_requests(direction: Optional[str] = None,
+                             status: Optional[str] = None,
+                             before_id: Optional[int] = None,
+                             limit: int = trades.DEFAULT_PAGE_SIZE,
+                             db: AsyncSession = Depends(get_read_db),
+                             current_user_id: int = Depends(get_current_user_id)):
+    trades.validate_filters(direction, status, before_id)
+    limit = max(1, min(limit, trades.MAX_PAGE_SIZE))
+    response = {"received": [], "sent": [], "next_cursor": {"received": None, "sent": None}}
+    for d in [direction] if direction else trades.DIRECTIONS:
+        items, next_cursor = await trades.fetch_page(
+            db, current_user_id, d, status=status, before_id=before_id, limit=limit
         )
-        .filter(models.TradeRequest.sender_id == current_user.id)
-        .all()
-    )
-
-    def serialize(r):
-        return {
-            "id": r.id,
-            "status": r.status,
-            "skill": r.skill.name if r.skill else None,
-            "sender": r.sender.username if r.sender else None,
-            "receiver": r.receiver.username if r.receiver else None,
-            "sender_id": r.sender_id,
-            "receiver_id": r.receiver_id,
-        }
-
-    return {
-        "received": [serialize(x) for x in received],
-        "sent": [serialize(x) for x in sent],
-    }
+        response[d] = items
+        response["next_cursor"][d] = next_cursor
+    return response
+
+@app.get("/trade/requests/counts", response_model=TradeRequestCounts)
+async def get_trade_request_counts(db: AsyncSession = Depends(get_read_db),
+                                   current_user_id: int = Depends(get_current_user_id)):
+    return await trades.pending_counts(db, current_user_id)
+
+@app.get("/trade/requests/{req_id}", response_model=TradeRequestResponse)
+async def get_trade_request(req_id: int, db: AsyncSession = Depends(get_read_db),
+                            current_user_id: int = Depends(get_current_user_id)):
+    request = await trades.fetch_one(db, current_user_id, req_id)
+    if request is None:
+        raise HTTPException(status_code=404, detail="Request not found")
+    return request
 
 @app.put("/trade/requests/{req_id}/accept")
-def accept_request(req_id: int, db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
-    req = db.query(models.TradeRequest).filter(
-        models.TradeRequest.id == req_id,
-        models.TradeRequest.receiver_id == current_user.id,
-    ).first()
+async def accept_request(req_id: int, db: AsyncSession = Depends(get_async_db),
+                         current_user_id: int = Depends(get_current_user_id)):
+    result = await db.execute(
+        select(models.TradeRequest).where(
+            models.TradeRequest.id == req_id,
+            models.TradeRequest.receiver_id == current_user_id,
+        )
+    )
+    req = result.scalars().first()
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     if req.status != "pending":
         raise HTTPException(status_code=400, detail="Already processed")
     req.status = "accepted"
-    db.commit()
-    db.refresh(req)
+    await db.commit()
+    trades.remember_accepted(req.id, req.sender_id, req.receiver_id)
     return {"status": "accepted"}
 
 @app.put("/trade/requests/{req_id}/reject")
-def reject_request(req_id: int, db: Session = Depends(get_db),
-                   current_user: models.User = Depends(get_current_user)):
-    req = db.query(models.TradeRequest).filter(
-        models.TradeRequest.id == req_id,
-        models.TradeRequest.receiver_id == current_user.id,
-    ).first()
+async def reject_request(req_id: int, db: AsyncSession = Depends(get_async_db),
+                         current_user_id: int = Depends(get_current_user_id)):
+    result = await db.execute(
+        select(models.TradeRequest).where(
+            models.TradeRequest.id == req_id,
+            models.TradeRequest.receiver_id == current_user_id,
+        )
+    )
+    req = result.scalars().first()
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     req.status = "rejected"
-    db.commit()
-    db.refresh(req)
+    await db.commit()
+    await trades.forget(req_id)
     return {"status": "rejected"}
 
-@app.get("/chat/user/{user_id}")
-def get_conversation_with_user(
+@app.get("/chat/user/{user_id}", response_model=ChatMessagePage)
+async def get_conversation_with_user(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
-):
-    conversation_key = f"{min(current_user.id, user_id)}_{max(current_user.id, user_id)}"
-    msgs = (
-        db.query(models.ChatMessage)
-        .filter(models.ChatMessage.conversation_key == conversation_key)
-        .order_by(models.ChatMessage.timestamp.asc())
-        .all()
-    )
-    return [
-        {
-            "id": m.id,
-            "sender_id": m.sender_id,
-            "receiver_id": m.receiver_id,
-            "message": m.message,
-            "timestamp": m.timestamp,
-            "conversation_key": m.conversation_key,
-        }
-        for m in msgs
-    ]
-
-@app.get("/chat/conversations")
-def list_conversations(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = chat.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    convo_keys = (
-        db.query(models.ChatMessage.conversation_key)
-        .filter(
-            (models.ChatMessage.sender_id == current_user.id)
-            | (models.ChatMessage.receiver_id == current_user.id)
-        )
-        .distinct()
-        .all()
+    key = chat.conversation_key_for(current_user_id, user_id)
+    if before_id is None and after_id is None:
+        return await chat_cache.first_page(db, key, limit)
+    return await chat_archive.fetch_conversation_page(
+        db,
+        key,
+        before_id=before_id,
+        after_id=after_id,
+        limit=limit,
     )
 
-    keys = [k[0] for k in convo_keys if k[0]]
-    conversations = []
-
-    for key in keys:
-        u1, u2 = map(int, key.split("_"))
-        partner_id = u2 if u1 == current_user.id else u1
+@app.get("/chat/conversations", response_model=ConversationPage)
+async def list_conversations(
+    before_key: Optional[str] = None,
+    limit: int = chat.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    limit = max(1, min(limit, chat.MAX_PAGE_SIZE))
+    conv = models.Conversation
+    is_a = conv.user_a_id == current_user_id
+    partner_id = case((is_a, conv.user_b_id), else_=conv.user_a_id)
+    position = tuple_(conv.last_message_at, conv.conversation_key)
 
-        partner = db.query(models.User).filter(models.User.id == partner_id).first()
-        latest = (
-            db.query(models.ChatMessage)
-            .filter(models.ChatMessage.conversation_key == key)
-            .order_by(models.ChatMessage.timestamp.desc())
-            .first()
+    query = (
+        select(
+            conv.conversation_key,
+            partner_id.label("partner_id"),
+            models.User.username.label("partner_username"),
+            func.coalesce(conv.last_message_text, "").label("latest_message"),
+            conv.last_message_at.label("timestamp"),
+            case((is_a, conv.unread_a), else_=conv.unread_b).label("unread_count"),
         )
-
-        conversations.append(
-            {
-                "conversation_key": key,
-                "partner_id": partner_id,
-                "partner_username": partner.username if partner else None,
-                "latest_message": latest.message if latest else "",
-                "timestamp": latest.timestamp.isoformat() if latest else None,
-            }
+        .join(models.User, models.User.id == partner_id)
+        .where(or_(is_a, conv.user_b_id == current_user_id))
+    )
+    if before_key:
+        anchor = await db.execute(
+            select(conv.last_message_at, conv.conversation_key)
+            .where(conv.conversation_key == before_key)
         )
+        anchor = anchor.first()
+        if not anchor:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(position < tuple(anchor))
 
-    conversations.sort(
-        key=lambda c: c["timestamp"] or "",
-        reverse=True
+    result = await db.execute(
+        query.order_by(conv.last_message_at.desc(), conv.conversation_key.desc()).limit(limit + 1)
     )
+    rows = result.all()
+    next_cursor = rows[limit - 1].conversation_key if len(rows) > limit else None
 
-    return {"conversations": conversations}
+    return {"conversations": rows[:limit], "next_cursor": next_cursor}
+
+@app.post("/chat/user/{user_id}/read")
+async def mark_conversation_read(
+    user_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user_id: int = Depends(get_current_user_id),
+):
+    await chat.mark_read(db, current_user_id, user_id)
+    await db.commit()
+    return {"status": "read"}
 
-@app.get("/chat/{request_id}")
-def get_chat_history(
+@app.get("/presence", response_model=PresencePage)
+async def get_presence(ids: str, db: AsyncSession = Depends(get_read_db),
+                       current_user_id: int = Depends(get_current_user_id)):
+    try:
+        user_ids = list(dict.fromkeys(int(i) for i in ids.split(",") if i.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of user ids")
+    if len(user_ids) > presence.PRESENCE_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {presence.PRESENCE_MAX_IDS} ids per request")
+    return {"users": await presence.registry.lookup(db, user_ids)}
+
+@app.get("/chat/{request_id}", response_model=ChatMessagePage)
+async def get_chat_history(
     request_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    limit: int = chat.DEFAULT_PAGE_SIZE,
+    db: AsyncSession = Depends(get_read_db),
+    current_user_id: int = Depends(get_current_user_id)
 ):
-    msgs = (
-        db.query(models.ChatMessage)
-        .filter(models.ChatMessage.request_id == request_id)
-        .order_by(models.ChatMessage.timestamp.asc())
-        .all()
+    return await chat.fetch_page(
+        db,
+        models.ChatMessage.request_id == request_id,
+        before_id=before_id,
+        after_id=after_id,
+        limit=limit,
     )
-    if not msgs:
-        return []
-    return [
-        {
-            "id": m.id,
-            "sender_id": m.sender_id,
-            "receiver_id": m.receiver_id,
-            "message": m.message,
-            "timestamp": m.timestamp,
-        }
-        for m in msgs
-    ]
 
 import socketio
+import realtime
 
 sio = socketio.AsyncServer(
     async_mode="asgi",
+    client_manager=realtime.make_client_manager(),
     cors_allowed_origins=[allowed],
     cors_credentials=True,
 )
 
-connected_users = {}
-
 @sio.event
 async def connect(sid, environ):
-    pass
+    metrics.socket_connected()
 
 @sio.event
 async def disconnect(sid):
-    for uid, user_sid in list(connected_users.items()):
-        if user_sid == sid:
-            del connected_users[uid]
-            break
+    metrics.socket_disconnected()
+    session = await sio.get_session(sid)
+    user_id = session.get("user_id")
+    presence.registry.disconnect(sid)
+    if user_id is not None:
+        await sio.leave_room(sid, realtime.user_room(user_id))
 
 @sio.on("register")
+@metrics.socket_event("register")
 async def register(sid, data):
     token = data.get("token")
     if not token:
@@ -386,17 +605,114 @@ async def register(sid, data):
         return
     try:
         user_id = verify_access_token(token)
-        connected_users[user_id] = sid
+        async with sio.session(sid) as session:
+            previous = session.get("user_id")
+            session["user_id"] = user_id
+        if previous is not None and previous != user_id:
+            await sio.leave_room(sid, realtime.user_room(previous))
+        await sio.enter_room(sid, realtime.user_room(user_id))
         await sio.emit("register_success", {"user_id": user_id}, to=sid)
     except Exception as e:
         await sio.emit("register_error", {"error": str(e)}, to=sid)
+        return
+    presence.registry.start(sio)
+    presence.registry.connect(sid, user_id)
+    await send_catch_up(sid, user_id)
+
+async def send_catch_up(sid, user_id: int, after: int = None):
+    messages, has_more = await delivery.tracker.undelivered(user_id, after)
+    async with sio.session(sid) as session:
+        # While a catch-up is in flight, acks are capped at the last id it
+        # sent so a live message cannot move the cursor past unsent ones.
+        session["catch_up_sent"] = messages[-1].id if has_more else None
+    if messages:
+        await sio.emit("catch_up", {
+            "messages": [chat.message_payload(m) for m in messages],
+            "has_more": has_more,
+        }, to=sid)
+
+@sio.on("ack_delivered")
+@metrics.socket_event("ack_delivered")
+async def ack_delivered(sid, data):
+    session = await sio.get_session(sid)
+    user_id = session.get("user_id")
+    try:
+        up_to = int(data["up_to"])
+    except (KeyError, TypeError, ValueError):
+        return
+    if user_id is None:
+        return
+    sent = session.get("catch_up_sent")
+    if sent is not None:
+        up_to = min(up_to, sent)
+    delivery.tracker.ack(user_id, up_to)
+    if sent is not None and up_to == sent:
+        await send_catch_up(sid, user_id, after=sent)
+
+@sio.on("ack_read")
+@metrics.socket_event("ack_read")
+async def ack_read(sid, data):
+    session = await sio.get_session(sid)
+    user_id = session.get("user_id")
+    try:
+        partner_id = int(data["user_id"])
+    except (KeyError, TypeError, ValueError):
+        return
+    if user_id is None:
+        return
+    delivery.tracker.start(sio)
+    delivery.tracker.read(user_id, partner_id)
+    database.mark_write(user_id)
+
+@sio.on("set_presence")
+@metrics.socket_event("set_presence")
+async def set_presence(sid, data):
+    status = (data or {}).get("status")
+    if status in (presence.ONLINE, presence.AWAY):
+        presence.registry.set_away(sid, status == presence.AWAY)
+
+@sio.on("presence_subscribe")
+@metrics.socket_event("presence_subscribe")
+async def presence_subscribe(sid, data):
+    session = await sio.get_session(sid)
+    if session.get("user_id") is None:
+        return
+    try:
+        user_ids = list(dict.fromkeys(int(i) for i in data["user_ids"]))[:presence.PRESENCE_MAX_IDS]
+    except (KeyError, TypeError, ValueError):
+        return
+    presence.registry.subscribe(sid, user_ids)
+    async with database.read_session() as db:
+        users = await presence.registry.lookup(db, user_ids)
+    await sio.emit("presence", {"users": users}, to=sid)
+
+@sio.on("typing")
+@metrics.socket_event("typing")
+@ratelimit.socket_limit(sio, "typing")
+async def typing(sid, data):
+    session = await sio.get_session(sid)
+    sender_id = session.get("user_id")
+    try:
+        receiver_id = int(data["to"])
+        is_typing = bool(data.get("typing", True))
+    except (KeyError, TypeError, ValueError):
+        return
+    if sender_id is None or not presence.registry.should_forward_typing(sender_id, receiver_id, is_typing):
+        return
+    await sio.emit(
+        "typing", {"user_id": sender_id, "typing": is_typing}, room=realtime.user_room(receiver_id)
+    )
 
 @sio.on("send_message")
+@metrics.socket_event("send_message")
+@ratelimit.socket_limit(sio, "send_message")
 async def handle_message(sid, data):
-    db = SessionLocal()
+    session = await sio.get_session(sid)
+    sender_id = session.get("user_id")
+    if sender_id is None:
+        await sio.emit("message_error", {"error": "Not registered"}, to=sid)
+        return
     try:
-        token = data.get("token")
-        sender_id = verify_access_token(token)
         receiver_id = int(data["receiver_id"])
         request_id = data.get("request_id")
         text = data["message"].strip()
@@ -404,47 +720,30 @@ async def handle_message(sid, data):
         if request_id is not None:
             try:
                 request_id = int(request_id)
-            except:
+            except (TypeError, ValueError):
                 request_id = None
 
-        trade = None
-        if request_id and request_id != 0:
-            trade = db.query(models.TradeRequest).filter(models.TradeRequest.id == request_id).first()
-            if not trade or trade.status != "accepted":
-                await sio.emit("message_error", {"error": "Trade not accepted"}, to=sid)
-                return
-
-        conversation_key = f"{min(sender_id, receiver_id)}_{max(sender_id, receiver_id)}"
-
-        msg = models.ChatMessage(
-            sender_id=sender_id,
-            receiver_id=receiver_id,
-            request_id=request_id,
-            message=text,
-            conversation_key=conversation_key
-        )
-        db.add(msg)
-        db.commit()
-        db.refresh(msg)
+        if request_id and not await trades.can_chat(request_id, sender_id, receiver_id):
+            await sio.emit("message_error", {"error": "Trade not accepted"}, to=sid)
+            return
 
-        out = {
-            "id": msg.id,
+        msg = await chat_writer.batcher.submit({
             "sender_id": sender_id,
             "receiver_id": receiver_id,
-            "message": text,
-            "timestamp": msg.timestamp.isoformat(),
             "request_id": request_id,
-            "conversation_key": msg.conversation_key,
-        }
+            "message": text,
+            "conversation_key": chat.conversation_key_for(sender_id, receiver_id),
+        })
+        database.mark_write(sender_id)
+
+        out = chat.message_payload(msg)
 
-        recv_sid = connected_users.get(receiver_id)
-        if recv_sid:
-            await sio.emit("receive_message", out, to=recv_sid)
+        await sio.emit("receive_message", out, room=realtime.user_room(receiver_id))
+        if receiver_id != sender_id:
+            await sio.emit("receive_message", out, room=realtime.user_room(sender_id), skip_sid=sid)
         await sio.emit("message_sent", out, to=sid)
 
     except Exception as e:
         await sio.emit("message_error", {"error": str(e)}, to=sid)
-    finally:
-        db.close()
 
 asgi_app = socketio.ASGIApp(sio, other_asgi_app=app)
@@ -0,0 +1,227 @@
+import asyncio
+import os
+import re
+import time
+from collections import defaultdict
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import select
+
+import models
+from database import read_session
+from tasks import PeriodicTask
+
+MATCHES_PER_USER = int(os.getenv("MATCHES_PER_USER", 200))
+MATCH_REFRESH_SECONDS = float(os.getenv("MATCH_REFRESH_SECONDS", 2))
+MATCH_REBUILD_SECONDS = float(os.getenv("MATCH_REBUILD_SECONDS", 600))
+MATCH_BLOCK_CELLS = int(os.getenv("MATCH_BLOCK_CELLS", 4_000_000))
+MATCH_DENSE_CELLS = int(os.getenv("MATCH_DENSE_CELLS", 16_000_000))
+SCORE_DECIMALS = 6
+
+NAME_WEIGHT = 1.0
+CATEGORY_WEIGHT = 0.5
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+EMPTY = (np.empty(0, np.int64), np.empty(0, np.float32))
+
+def skill_features(name: str, category: str):
+    features = {}
+    if category and category.strip():
+        features["c:" + category.strip().lower()] = CATEGORY_WEIGHT
+    for token in re.findall(r"\w+", (name or "").lower()):
+        features["n:" + token] = NAME_WEIGHT
+    return features
+
+def _dense(matrix):
+    return matrix.toarray() if sparse.issparse(matrix) else np.asarray(matrix)
+
+# Scores are reciprocal: s(u, v) is the share of v's wanted-skill weight that
+# u teaches, and a match is the geometric mean of s(u, v) and s(v, u), so it
+# is symmetric and zero unless each side teaches something the other wants.
+# Each user's top matches are kept as score-descending numpy arrays.
+class MatchIndex:
+    def __init__(self, per_user: int = MATCHES_PER_USER, session_factory=read_session):
+        self.per_user = per_user
+        self.session_factory = session_factory
+        self.features = {}
+        self.teach = {}
+        self.wants = {}
+        self.matches = {}
+        self.dirty = set()
+        self.ready = False
+        self.rebuilt_at = None
+        self.updater = PeriodicTask("Match index update", self.update, MATCH_REFRESH_SECONDS)
+
+    def mark_dirty(self, user_id: int):
+        self.dirty.add(user_id)
+
+    def page(self, user_id: int, offset: int, limit: int):
+        partners, scores = self.matches.get(user_id, EMPTY)
+        end = offset + limit
+        next_cursor = end if end < len(partners) else None
+        return list(zip(partners[offset:end].tolist(), scores[offset:end].tolist())), next_cursor
+
+    async def update(self):
+        if self.rebuilt_at is None or time.monotonic() - self.rebuilt_at >= MATCH_REBUILD_SECONDS:
+            await self.rebuild()
+            self.rebuilt_at = time.monotonic()
+        elif self.dirty:
+            await self.refresh()
+
+    async def _load(self, user_ids=None):
+        teach, wants = defaultdict(dict), defaultdict(dict)
+        async with self.session_factory() as db:
+            for model, target in ((models.Skill, teach), (models.WantedSkill, wants)):
+                query = select(model.user_id, model.name, model.category)
+                if user_ids is not None:
+                    query = query.where(model.user_id.in_(user_ids))
+                result = await db.stream(query.execution_options(yield_per=5000))
+                async for user_id, name, category in result:
+                    for feature, weight in skill_features(name, category).items():
+                        target[user_id][feature] = max(weight, target[user_id].get(feature, 0))
+        return teach, wants
+
+    def _vector(self, features, normalize: bool):
+        cols = np.fromiter(
+            (self.features.setdefault(f, len(self.features)) for f in features), dtype=np.int32
+        )
+        weights = np.fromiter(features.values(), dtype=np.float32)
+        if normalize:
+            weights /= weights.sum()
+        else:
+            weights[:] = 1
+        return cols, weights
+
+    def _store(self, user_id, teach, wants):
+        if teach:
+            self.teach[user_id] = self._vector(teach, normalize=False)
+        else:
+            self.teach.pop(user_id, None)
+        if wants:
+            self.wants[user_id] = self._vector(wants, normalize=True)
+        else:
+            self.wants.pop(user_id, None)
+
+    def _matrix(self, vectors, user_ids):
+        rows = [vectors[u] for u in user_ids]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(cols) for cols, _ in rows], out=indptr[1:])
+        indices = np.concatenate([cols for cols, _ in rows]) if rows else np.empty(0, np.int32)
+        data = np.concatenate([w for _, w in rows]) if rows else np.empty(0, np.float32)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(rows), len(self.features)))
+
+    def _score(self, targets, top=None):
+        user_ids = np.array(sorted(self.teach.keys() & self.wants.keys()), dtype=np.int64)
+        position = {u: i for i, u in enumerate(user_ids.tolist())}
+        teach = self._matrix(self.teach, user_ids.tolist())
+        wants = self._matrix(self.wants, user_ids.tolist())
+        # Only features that someone teaches and someone wants can score.
+        shared = np.intersect1d(teach.indices, wants.indices)
+        teach, wants = teach[:, shared], wants[:, shared]
+        # Most users share a category with many others, so score blocks are
+        # close to dense; multiplying by a dense right-hand side is far
+        # cheaper than a sparse product whenever it fits in memory.
+        if len(shared) * len(user_ids) <= MATCH_DENSE_CELLS:
+            teach_t, wants_t = teach.T.toarray(), wants.T.toarray()
+        else:
+            teach_t, wants_t = teach.T.tocsr(), wants.T.tocsr()
+
+        rows = np.array([position[u] for u in targets if u in position], dtype=np.int64)
+        scored = dict.fromkeys(targets, EMPTY)
+        block_size = max(1, MATCH_BLOCK_CELLS // max(len(user_ids), 1))
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            forward = _dense(teach[block] @ wants_t)
+            backward = _dense(wants[block] @ teach_t)
+            mutual = np.sqrt(forward * backward, out=forward)
+            # Rounded so partial rescoring and full rebuilds agree on ties
+            # despite differences in the last bits of the products.
+            mutual = np.round(mutual, SCORE_DECIMALS, out=mutual)
+            mutual[np.arange(len(block)), block] = 0
+            if top is not None and top < mutual.shape[1]:
+                floors = -np.partition(-mutual, top - 1, axis=1)[:, top - 1]
+            else:
+                floors = np.zeros(len(block), dtype=mutual.dtype)
+            for i, row in enumerate(block.tolist()):
+                # Ties at the floor are all kept until the order is fixed,
+                # so the cut is the same however the row was computed.
+                cols = np.flatnonzero(mutual[i] >= max(floors[i], np.float32(1e-9)))
+                scores = mutual[i][cols]
+                order = np.lexsort((cols, -scores))[:top]
+                scored[int(user_ids[row])] = (user_ids[cols[order]], scores[order])
+        return scored
+
+    def _set_entry(self, owner, partner, score):
+        """Move `partner` to `score` in `owner`'s list, ordered by score
+        then partner id. Returns False when the list can no longer be kept
+        exact, because a partner the index never saw may now belong in it.
+        """
+        partners, scores = self.matches.get(owner, EMPTY)
+        full = len(partners) >= self.per_user
+        present = bool((partners == partner).any())
+        if full:
+            below_floor = (-score, partner) > (-scores[-1], partners[-1])
+            if present and (score <= 0 or below_floor):
+                return False
+            if not present and (score <= 0 or below_floor):
+                return True
+        keep = partners != partner
+        partners, scores = partners[keep], scores[keep]
+        if score > 0:
+            i = int(np.count_nonzero((scores > score) | ((scores == score) & (partners < partner))))
+            partners = np.insert(partners, i, partner)[:self.per_user]
+            scores = np.insert(scores, i, score)[:self.per_user]
+        if len(partners):
+            self.matches[owner] = (partners, scores)
+        else:
+            self.matches.pop(owner, None)
+        return True
+
+    async def rebuild(self):
+        self.dirty.clear()
+        teach, wants = await self._load()
+        self.features = {}
+        self.teach, self.wants = {}, {}
+        for user_id in teach.keys() | wants.keys():
+            self._store(user_id, teach.get(user_id), wants.get(user_id))
+
+        targets = list(self.teach.keys() & self.wants.keys())
+        scored = await asyncio.to_thread(self._score, targets, self.per_user)
+        self.matches = {u: row for u, row in scored.items() if len(row[0])}
+        self.ready = True
+
+    async def refresh(self):
+        changed, self.dirty = self.dirty, set()
+        teach, wants = await self._load(list(changed))
+        previous = await asyncio.to_thread(self._score, list(changed))
+        for user_id in changed:
+            self._store(user_id, teach.get(user_id), wants.get(user_id))
+        scored = await asyncio.to_thread(self._score, list(changed))
+        stale = set()
+
+        for user_id, (partners, scores) in scored.items():
+            if len(partners):
+                self.matches[user_id] = (partners[:self.per_user], scores[:self.per_user])
+            else:
+                self.matches.pop(user_id, None)
+            # Scores are symmetric, so the new row is also every other user's
+            # score for this one; owners whose list loses an entry it cannot
+            # refill are rescored in full.
+            old = dict(zip(*(a.tolist() for a in previous[user_id])))
+            new = dict(zip(partners.tolist(), scores.tolist()))
+            for partner in (old.keys() | new.keys()) - changed - stale:
+                if not self._set_entry(partner, user_id, np.float32(new.get(partner, 0))):
+                    stale.add(partner)
+
+        if stale:
+            rescored = await asyncio.to_thread(self._score, list(stale), self.per_user)
+            for user_id, row in rescored.items():
+                if len(row[0]):
+                    self.matches[user_id] = row
+                else:
+                    self.matches.pop(user_id, None)
+
+index = MatchIndex()
@@ -0,0 +1,152 @@
+import contextvars
+import functools
+import logging
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+HTTP_REQUEST_QUERIES = Histogram(
+    "http_request_db_queries", "Database queries issued per HTTP request", ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Database time spent per HTTP request", ["method", "route"]
+)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Database query latency")
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_MS", ["route"])
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "db_pool_checkout_seconds", "Time spent waiting for a pooled connection", ["pool"]
+)
+DB_POOL_CONNECTIONS = Gauge("db_pool_connections", "Pooled connections", ["pool", "state"])
+SOCKETS_CONNECTED = Gauge("socketio_connected_sockets", "Connected Socket.IO clients")
+SOCKET_EVENTS = Counter("socketio_events_total", "Socket.IO events received", ["event"])
+SOCKET_EVENT_SECONDS = Histogram(
+    "socketio_event_duration_seconds", "Socket.IO event handler latency", ["event"]
+)
+RATE_LIMITED = Counter("rate_limited_total", "Requests and events rejected by a rate limit", ["limit"])
+HOT_CHAT_READS = Counter("hot_chat_reads_total", "First-page chat reads by hot buffer result", ["result"])
+
+class RequestStats:
+    __slots__ = ("scope", "queries", "db_seconds")
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @property
+    def route(self):
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+current_request = contextvars.ContextVar("current_request", default=None)
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = current_request.set(stats)
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_request.reset(token)
+            method, route = scope["method"], stats.route
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status_code)).observe(
+                time.perf_counter() - started
+            )
+            HTTP_REQUEST_QUERIES.labels(method, route).observe(stats.queries)
+            HTTP_REQUEST_DB_SECONDS.labels(method, route).observe(stats.db_seconds)
+
+# The start time lives on the execution context, so a statement that raises
+# (and never reaches after_cursor_execute) leaves nothing behind.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    DB_QUERY_SECONDS.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        route = stats.route if stats is not None else "-"
+        DB_SLOW_QUERIES.labels(route).inc()
+        logger.warning("Slow query (%.1f ms) on %s: %s", elapsed * 1000, route, " ".join(statement.split())[:1000])
+
+def instrument_engine(engine, name: str):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    DB_POOL_CONNECTIONS.labels(name, "in_use").set_function(lambda: engine.pool.checkedout())
+    DB_POOL_CONNECTIONS.labels(name, "idle").set_function(lambda: engine.pool.checkedin())
+
+class TimedCheckoutMixin:
+    pool_name = "default"
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(self.pool_name).observe(time.perf_counter() - started)
+
+def instrumented_pool(name: str, is_async: bool = True):
+    """Pool class whose checkout waits are labelled `name`; a class rather
+    than an attribute so pools recreated by dispose() keep the label."""
+    base = AsyncAdaptedQueuePool if is_async else QueuePool
+    return type(f"Instrumented{base.__name__}", (TimedCheckoutMixin, base), {"pool_name": name})
+
+def socket_connected():
+    SOCKET_EVENTS.labels("connect").inc()
+    SOCKETS_CONNECTED.inc()
+
+def socket_disconnected():
+    SOCKET_EVENTS.labels("disconnect").inc()
+    SOCKETS_CONNECTED.dec()
+
+def socket_event(name: str):
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args):
+            SOCKET_EVENTS.labels(name).inc()
+            started = time.perf_counter()
+            try:
+                return await handler(*args)
+            finally:
+                SOCKET_EVENT_SECONDS.labels(name).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+def render():
+    return generate_latest()
@@ -0,0 +1,66 @@
+import time
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+
+from database import Base, DATABASE_URL
+import models
+import partitions
+
+config = context.config
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+# Serializes concurrent `alembic upgrade` runs (e.g. several containers
+# starting at once) so each migration is applied exactly once.
+MIGRATION_LOCK_KEY = 7261535
+MIGRATION_LOCK_POLL = 0.5
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Monthly chat partitions are created at runtime and not in the models.
+    table = obj if type_ == "table" else getattr(obj, "table", None)
+    return table is None or not partitions.is_partition(table.name)
+
+def run_migrations_offline():
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        include_object=include_object,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def acquire_lock(connection):
+    # Polled rather than blocking: a session parked in pg_advisory_lock holds
+    # a snapshot, which CREATE INDEX CONCURRENTLY would wait on forever.
+    while not connection.execute(
+        text("SELECT pg_try_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY}
+    ).scalar():
+        time.sleep(MIGRATION_LOCK_POLL)
+
+def run_migrations_online():
+    connectable = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with connectable.connect() as lock_connection:
+        lock_connection = lock_connection.execution_options(isolation_level="AUTOCOMMIT")
+        acquire_lock(lock_connection)
+        try:
+            with connectable.connect() as connection:
+                context.configure(
+                    connection=connection,
+                    target_metadata=target_metadata,
+                    include_object=include_object,
+                )
+                with context.begin_transaction():
+                    context.run_migrations()
+        finally:
+            lock_connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,149 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18 10:00:00
+
+Databases created by the old ``create_all`` startup hook already contain
+these tables; anything that exists is left alone so they can be stamped
+forward without a rebuild.
+"""
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+SKILL_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(skills.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(skills.category, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(skills.description, '')), 'C')"
+)
+
+BACKFILL_CONVERSATIONS = """
+    INSERT INTO conversations (
+        conversation_key, user_a_id, user_b_id,
+        last_message_id, last_message_text, last_message_at, last_sender_id
+    )
+    SELECT DISTINCT ON (conversation_key)
+        conversation_key, least(sender_id, receiver_id), greatest(sender_id, receiver_id),
+        id, message, timestamp, sender_id
+    FROM chat_messages
+    WHERE conversation_key IS NOT NULL
+    ORDER BY conversation_key, timestamp DESC, id DESC
+"""
+
+def upgrade():
+    # Offline (--sql) output targets an empty database.
+    if context.is_offline_mode():
+        has_table = lambda name: False
+    else:
+        has_table = sa.inspect(op.get_bind()).has_table
+
+    if not has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("password", sa.String(), nullable=False),
+        )
+    op.create_index("ix_users_id", "users", ["id"], if_not_exists=True)
+    op.create_index("ix_users_username", "users", ["username"], unique=True, if_not_exists=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True, if_not_exists=True)
+
+    if not has_table("skills"):
+        op.create_table(
+            "skills",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.String()),
+            sa.Column("category", sa.String()),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        )
+    op.create_index("ix_skills_id", "skills", ["id"], if_not_exists=True)
+    op.create_index("ix_skills_name", "skills", ["name"], if_not_exists=True)
+    op.create_index(
+        "ix_skills_category_lower", "skills", [sa.text("lower(category)"), "id"], if_not_exists=True
+    )
+    op.create_index(
+        "ix_skills_search", "skills", [sa.text(f"({SKILL_SEARCH_DOCUMENT})")],
+        postgresql_using="gin", if_not_exists=True,
+    )
+
+    if not has_table("trade_requests"):
+        op.create_table(
+            "trade_requests",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+            sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+            sa.Column("skill_id", sa.Integer(), sa.ForeignKey("skills.id", ondelete="CASCADE")),
+            sa.Column("status", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        )
+    op.create_index("ix_trade_requests_id", "trade_requests", ["id"], if_not_exists=True)
+
+    if not has_table("chat_messages"):
+        op.create_table(
+            "chat_messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column(
+                "request_id", sa.Integer(),
+                sa.ForeignKey("trade_requests.id", ondelete="CASCADE"), nullable=True,
+            ),
+            sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+            sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+            sa.Column("message", sa.String(), nullable=False),
+            sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("conversation_key", sa.String(), nullable=True),
+        )
+    op.create_index("ix_chat_messages_id", "chat_messages", ["id"], if_not_exists=True)
+    op.create_index(
+        "ix_chat_messages_conversation_key", "chat_messages", ["conversation_key"], if_not_exists=True
+    )
+    op.create_index(
+        "ix_chat_messages_conversation_ts_id", "chat_messages",
+        ["conversation_key", "timestamp", "id"], if_not_exists=True,
+    )
+    op.create_index(
+        "ix_chat_messages_request_ts_id", "chat_messages",
+        ["request_id", "timestamp", "id"], if_not_exists=True,
+    )
+
+    if not has_table("conversations"):
+        op.create_table(
+            "conversations",
+            sa.Column("conversation_key", sa.String(), primary_key=True),
+            sa.Column(
+                "user_a_id", sa.Integer(),
+                sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False,
+            ),
+            sa.Column(
+                "user_b_id", sa.Integer(),
+                sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False,
+            ),
+            sa.Column("last_message_id", sa.Integer(), nullable=True),
+            sa.Column("last_message_text", sa.String(), nullable=True),
+            sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True),
+            sa.Column("last_sender_id", sa.Integer(), nullable=True),
+            sa.Column("unread_a", sa.Integer(), server_default="0", nullable=False),
+            sa.Column("unread_b", sa.Integer(), server_default="0", nullable=False),
+        )
+        op.execute(BACKFILL_CONVERSATIONS)
+    op.create_index(
+        "ix_conversations_user_a_last", "conversations",
+        ["user_a_id", "last_message_at"], if_not_exists=True,
+    )
+    op.create_index(
+        "ix_conversations_user_b_last", "conversations",
+        ["user_b_id", "last_message_at"], if_not_exists=True,
+    )
+
+def downgrade():
+    op.drop_table("conversations")
+    op.drop_table("chat_messages")
+    op.drop_table("trade_requests")
+    op.drop_table("skills")
+    op.drop_table("users")
@@ -0,0 +1,43 @@
+"""hot path indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:30:00
+
+Indexes are built CONCURRENTLY outside the migration transaction so large
+tables stay writable while they build.
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_trade_requests_receiver_status", "trade_requests", ["receiver_id", "status", "id"]),
+    ("ix_trade_requests_sender_status", "trade_requests", ["sender_id", "status", "id"]),
+    ("ix_trade_requests_skill_id", "trade_requests", ["skill_id"]),
+    ("ix_chat_messages_sender_id", "chat_messages", ["sender_id"]),
+    ("ix_chat_messages_receiver_id", "chat_messages", ["receiver_id", "id"]),
+    ("ix_skills_user_id", "skills", ["user_id"]),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+        # Leading column of ix_chat_messages_conversation_ts_id; redundant.
+        op.drop_index(
+            "ix_chat_messages_conversation_key", table_name="chat_messages",
+            postgresql_concurrently=True, if_exists=True,
+        )
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_chat_messages_conversation_key", "chat_messages", ["conversation_key"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
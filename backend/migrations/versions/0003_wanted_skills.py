@@ -0,0 +1,30 @@
+"""wanted skills
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 12:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table(
+        "wanted_skills",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("category", sa.String()),
+        sa.Column(
+            "user_id", sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False,
+        ),
+    )
+    op.create_index("ix_wanted_skills_id", "wanted_skills", ["id"])
+    op.create_index("ix_wanted_skills_user_id", "wanted_skills", ["user_id"])
+
+def downgrade():
+    op.drop_table("wanted_skills")
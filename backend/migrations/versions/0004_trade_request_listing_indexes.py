@@ -0,0 +1,30 @@
+"""trade request listing indexes
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 13:00:00
+
+Unfiltered listings page by id within one direction; the (owner, status, id)
+indexes only serve that order once a status is fixed.
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_trade_requests_receiver_id", "trade_requests", ["receiver_id", "id"]),
+    ("ix_trade_requests_sender_id", "trade_requests", ["sender_id", "id"]),
+]
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
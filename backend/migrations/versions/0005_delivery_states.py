@@ -0,0 +1,39 @@
+"""delivery states
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 14:00:00
+
+Existing users start with everything they were sent marked as delivered,
+so the first reconnect after the upgrade does not replay their history.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+BACKFILL_DELIVERY_STATES = """
+    INSERT INTO delivery_states (user_id, last_delivered_id)
+    SELECT receiver_id, max(id)
+    FROM chat_messages
+    WHERE receiver_id IS NOT NULL
+    GROUP BY receiver_id
+"""
+
+def upgrade():
+    op.create_table(
+        "delivery_states",
+        sa.Column(
+            "user_id", sa.Integer(),
+            sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True,
+        ),
+        sa.Column("last_delivered_id", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.execute(BACKFILL_DELIVERY_STATES)
+
+def downgrade():
+    op.drop_table("delivery_states")
@@ -0,0 +1,19 @@
+"""user last seen
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 15:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.add_column("users", sa.Column("last_seen_at", sa.DateTime(timezone=True), nullable=True))
+
+def downgrade():
+    op.drop_column("users", "last_seen_at")
@@ -0,0 +1,89 @@
+"""partition chat messages by month
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 16:00:00
+
+Rebuilds chat_messages as a table range-partitioned on timestamp with one
+partition per UTC calendar month. Existing rows are copied inside the
+migration, so expect a full rewrite of the table. Later partitions are
+created ahead of time by the app (see partitions.py).
+"""
+from datetime import datetime, timezone
+
+from alembic import context, op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+COLUMNS = "id, request_id, sender_id, receiver_id, message, timestamp, conversation_key"
+MONTHS_AHEAD = 3
+
+INDEXES = [
+    ("ix_chat_messages_conversation_ts_id", ["conversation_key", "timestamp", "id"]),
+    ("ix_chat_messages_request_ts_id", ["request_id", "timestamp", "id"]),
+    ("ix_chat_messages_sender_id", ["sender_id"]),
+    ("ix_chat_messages_receiver_id", ["receiver_id", "id"]),
+]
+
+def add_months(month, n):
+    years, index = divmod(month.month - 1 + n, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+def message_columns(partitioned):
+    return [
+        sa.Column("id", sa.Integer(), nullable=False,
+                  server_default=sa.text("nextval('chat_messages_id_seq'::regclass)")),
+        sa.Column("request_id", sa.Integer(), sa.ForeignKey("trade_requests.id", ondelete="CASCADE")),
+        sa.Column("sender_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("receiver_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE")),
+        sa.Column("message", sa.String(), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.func.now(),
+                  nullable=not partitioned),
+        sa.Column("conversation_key", sa.String()),
+        sa.PrimaryKeyConstraint(*(["id", "timestamp"] if partitioned else ["id"]), name="chat_messages_pkey"),
+    ]
+
+def set_aside_old_table():
+    op.execute("ALTER TABLE chat_messages RENAME TO chat_messages_old")
+    op.execute("ALTER TABLE chat_messages_old RENAME CONSTRAINT chat_messages_pkey TO chat_messages_old_pkey")
+    for name, _ in INDEXES:
+        op.drop_index(name, table_name="chat_messages_old", if_exists=True)
+    op.drop_index("ix_chat_messages_id", table_name="chat_messages_old", if_exists=True)
+
+def replace_old_table(select_columns):
+    op.execute(f"INSERT INTO chat_messages ({COLUMNS}) SELECT {select_columns} FROM chat_messages_old")
+    op.execute("ALTER SEQUENCE chat_messages_id_seq OWNED BY chat_messages.id")
+    op.drop_table("chat_messages_old")
+    for name, columns in INDEXES:
+        op.create_index(name, "chat_messages", columns)
+
+def upgrade():
+    first = None
+    if not context.is_offline_mode():
+        first = op.get_bind().execute(sa.text("SELECT min(timestamp) FROM chat_messages")).scalar()
+    now = datetime.now(timezone.utc)
+    month = (first or now).astimezone(timezone.utc).date().replace(day=1)
+    last = add_months(now.date().replace(day=1), MONTHS_AHEAD)
+
+    set_aside_old_table()
+    op.create_table(
+        "chat_messages", *message_columns(partitioned=True),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    while month <= last:
+        op.execute(
+            f"CREATE TABLE chat_messages_p{month:%Y%m} PARTITION OF chat_messages "
+            f"FOR VALUES FROM ('{month} 00:00+00') TO ('{add_months(month, 1)} 00:00+00')"
+        )
+        month = add_months(month, 1)
+    replace_old_table(COLUMNS.replace("timestamp", "coalesce(timestamp, now())"))
+
+def downgrade():
+    set_aside_old_table()
+    op.create_table("chat_messages", *message_columns(partitioned=False))
+    replace_old_table(COLUMNS)
+    op.create_index("ix_chat_messages_id", "chat_messages", ["id"])
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, func
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Index, func, text
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -9,8 +9,10 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password = Column(String, nullable=False)
+    last_seen_at = Column(DateTime(timezone=True), nullable=True)
 
     skills = relationship("Skill", back_populates="owner", cascade="all, delete-orphan")
+    wanted_skills = relationship("WantedSkill", back_populates="owner", cascade="all, delete-orphan")
     sent_requests = relationship(
         "TradeRequest",
         foreign_keys="TradeRequest.sender_id",
@@ -37,6 +39,12 @@ class User(Base):
         cascade="all, delete-orphan"
     )
 
+SKILL_SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple', coalesce(skills.name, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(skills.category, '')), 'B') || "
+    "setweight(to_tsvector('simple', coalesce(skills.description, '')), 'C')"
+)
+
 class Skill(Base):
     __tablename__ = "skills"
 
@@ -53,6 +61,26 @@ class Skill(Base):
         cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        Index("ix_skills_user_id", "user_id"),
+        Index("ix_skills_category_lower", text("lower(category)"), "id"),
+        Index("ix_skills_search", text(f"({SKILL_SEARCH_DOCUMENT})"), postgresql_using="gin"),
+    )
+
+class WantedSkill(Base):
+    __tablename__ = "wanted_skills"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    category = Column(String)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+
+    owner = relationship("User", back_populates="wanted_skills")
+
+    __table_args__ = (
+        Index("ix_wanted_skills_user_id", "user_id"),
+    )
+
 class TradeRequest(Base):
     __tablename__ = "trade_requests"
 
@@ -73,17 +101,63 @@ class TradeRequest(Base):
         cascade="all, delete-orphan"
     )
 
+    __table_args__ = (
+        Index("ix_trade_requests_receiver_status", "receiver_id", "status", "id"),
+        Index("ix_trade_requests_sender_status", "sender_id", "status", "id"),
+        Index("ix_trade_requests_receiver_id", "receiver_id", "id"),
+        Index("ix_trade_requests_sender_id", "sender_id", "id"),
+        Index("ix_trade_requests_skill_id", "skill_id"),
+    )
+
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
 
-    id = Column(Integer, primary_key=True, index=True)
+    # Partitioned by month on timestamp (see partitions.py), which has to be
+    # part of the primary key.
+    id = Column(Integer, primary_key=True, autoincrement=True)
     request_id = Column(Integer, ForeignKey("trade_requests.id", ondelete="CASCADE"), nullable=True)
     sender_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     receiver_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     message = Column(String, nullable=False)
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
-    conversation_key = Column(String, index=True, nullable=True)
+    timestamp = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    conversation_key = Column(String, nullable=True)
 
     sender = relationship("User", foreign_keys=[sender_id], back_populates="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], back_populates="received_messages")
     request = relationship("TradeRequest", back_populates="chat_messages")
+
+    __table_args__ = (
+        Index("ix_chat_messages_conversation_ts_id", "conversation_key", "timestamp", "id"),
+        Index("ix_chat_messages_request_ts_id", "request_id", "timestamp", "id"),
+        Index("ix_chat_messages_sender_id", "sender_id"),
+        Index("ix_chat_messages_receiver_id", "receiver_id", "id"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
+class Conversation(Base):
+    __tablename__ = "conversations"
+
+    conversation_key = Column(String, primary_key=True)
+    user_a_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_b_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    last_message_id = Column(Integer, nullable=True)
+    last_message_text = Column(String, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_sender_id = Column(Integer, nullable=True)
+    unread_a = Column(Integer, default=0, server_default="0", nullable=False)
+    unread_b = Column(Integer, default=0, server_default="0", nullable=False)
+
+    user_a = relationship("User", foreign_keys=[user_a_id])
+    user_b = relationship("User", foreign_keys=[user_b_id])
+
+    __table_args__ = (
+        Index("ix_conversations_user_a_last", "user_a_id", "last_message_at"),
+        Index("ix_conversations_user_b_last", "user_b_id", "last_message_at"),
+    )
+
+class DeliveryState(Base):
+    __tablename__ = "delivery_states"
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    last_delivered_id = Column(Integer, default=0, server_default="0", nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
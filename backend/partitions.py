@@ -0,0 +1,83 @@
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+
+from sqlalchemy import text
+
+from database import async_engine
+from tasks import PeriodicTask
+
+CHAT_PARTITION_MONTHS_AHEAD = int(os.getenv("CHAT_PARTITION_MONTHS_AHEAD", 3))
+CHAT_PARTITION_CHECK_SECONDS = float(os.getenv("CHAT_PARTITION_CHECK_SECONDS", 6 * 3600))
+
+PARENT = "chat_messages"
+PARTITION_PATTERN = re.compile(rf"^{PARENT}_p(\d{{4}})(\d{{2}})$")
+# Distinct from the migration lock so maintenance never waits on a deploy.
+MAINTENANCE_LOCK_KEY = 7261536
+
+logger = logging.getLogger(__name__)
+
+def add_months(month: date, n: int):
+    years, index = divmod(month.month - 1 + n, 12)
+    return month.replace(year=month.year + years, month=index + 1)
+
+def current_month():
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+def partition_name(month: date):
+    return f"{PARENT}_p{month:%Y%m}"
+
+def partition_month(name: str):
+    match = PARTITION_PATTERN.match(name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+def is_partition(name: str):
+    return partition_month(name) is not None
+
+async def list_partitions(conn):
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    ), {"parent": PARENT})
+    months = (partition_month(name) for name in result.scalars())
+    return sorted(month for month in months if month is not None)
+
+def partition_ddl(month: date):
+    return text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{month} 00:00+00') TO ('{add_months(month, 1)} 00:00+00')"
+    )
+
+def months_between(first: datetime, last: datetime):
+    month = first.astimezone(timezone.utc).date().replace(day=1)
+    end = last.astimezone(timezone.utc).date().replace(day=1)
+    while month <= end:
+        yield month
+        month = add_months(month, 1)
+
+async def create_partition(conn, month: date):
+    await conn.execute(partition_ddl(month))
+
+async def try_lock(conn):
+    return await conn.scalar(
+        text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": MAINTENANCE_LOCK_KEY}
+    )
+
+async def ensure_partitions(engine=async_engine, months_ahead: int = CHAT_PARTITION_MONTHS_AHEAD):
+    """Create any missing partitions from this month to `months_ahead` months out."""
+    first = current_month()
+    wanted = [add_months(first, n) for n in range(months_ahead + 1)]
+    async with engine.connect() as conn:
+        missing = sorted(set(wanted) - set(await list_partitions(conn)))
+        if not missing:
+            return []
+        if not await try_lock(conn):
+            return []
+        for month in missing:
+            await create_partition(conn, month)
+        await conn.commit()
+    logger.info("Created chat partitions %s", ", ".join(map(partition_name, missing)))
+    return missing
+
+maintainer = PeriodicTask("Chat partition maintenance", ensure_partitions, CHAT_PARTITION_CHECK_SECONDS)
@@ -0,0 +1,67 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 32))
+PASSWORD_HASH_RETRY_AFTER = int(os.getenv("PASSWORD_HASH_RETRY_AFTER", 2))
+
+# min/max pinned to the configured cost so hashes made with any other cost
+# are reported as needing an update and get rehashed on the next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = None
+_in_flight = 0
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=PASSWORD_HASH_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+def _hash(password: str):
+    return pwd_context.hash(password)
+
+def _verify_and_update(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+async def _run(fn, *args):
+    global _in_flight
+    if _in_flight >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry shortly",
+            headers={"Retry-After": str(PASSWORD_HASH_RETRY_AFTER)},
+        )
+    _in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    finally:
+        _in_flight -= 1
+
+async def hash_password(password: str):
+    return await _run(_hash, password)
+
+async def verify_password(password: str, hashed: str):
+    return await _run(_verify_and_update, password, hashed)
+
+def shutdown():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
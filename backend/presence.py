@@ -0,0 +1,268 @@
+import logging
+import os
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import bindparam, select, update
+
+import models
+import realtime
+from cache import TTLCache
+from database import AsyncSessionLocal
+from tasks import PeriodicTask
+
+PRESENCE_FLUSH_MS = float(os.getenv("PRESENCE_FLUSH_MS", 500))
+PRESENCE_OFFLINE_GRACE = float(os.getenv("PRESENCE_OFFLINE_GRACE", 5))
+PRESENCE_ANNOUNCE_SECONDS = float(os.getenv("PRESENCE_ANNOUNCE_SECONDS", 30))
+PRESENCE_MAX_IDS = int(os.getenv("PRESENCE_MAX_IDS", 200))
+TYPING_THROTTLE_MS = float(os.getenv("TYPING_THROTTLE_MS", 2000))
+
+ONLINE, AWAY, OFFLINE = "online", "away", "offline"
+
+logger = logging.getLogger(__name__)
+
+def entry(user_id: int, status: str, last_seen=None):
+    return {
+        "user_id": user_id,
+        "status": status,
+        "last_seen": last_seen.isoformat() if last_seen else None,
+    }
+
+class PresenceRegistry:
+    """Presence of the users connected to this process, merged with what
+    the other workers announce over the realtime bus.
+
+    Changes only mark a user dirty; a periodic flush publishes this
+    worker's changes to the other workers and fans the merged state out to
+    each watching socket as one batched `presence` event, so flaps inside a
+    flush window (and reconnects inside the offline grace period) never
+    reach the watchers. Each worker re-announces its users every
+    `announce_seconds`; entries of a worker that stops announcing expire
+    after three missed rounds.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, flush_ms: float = PRESENCE_FLUSH_MS,
+                 grace: float = PRESENCE_OFFLINE_GRACE, typing_ms: float = TYPING_THROTTLE_MS,
+                 announce_seconds: float = PRESENCE_ANNOUNCE_SECONDS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_ms / 1000
+        self.grace = grace
+        self.host = uuid.uuid4().hex
+        self.remote_ttl = announce_seconds * 3
+        self.remote = {}
+        self.changed = set()
+        self.sockets = {}
+        self.users = defaultdict(set)
+        self.status = {}
+        self.leaving = {}
+        self.watchers = defaultdict(set)
+        self.watching = {}
+        self.dirty = set()
+        self.recently_seen = TTLCache(maxsize=10000, ttl=3600)
+        self.typing = TTLCache(maxsize=10000, ttl=typing_ms / 1000)
+        self.sio = None
+        self.flusher = PeriodicTask("Presence flush", self.flush, self.flush_interval, delay_first=True)
+        self.announcer = PeriodicTask("Presence announce", self.announce, announce_seconds)
+
+    def start(self, sio):
+        self.sio = sio
+        self.flusher.start()
+        self.announcer.start()
+
+    async def stop(self):
+        await self.flusher.stop()
+        await self.announcer.stop()
+        for user_id in self.leaving:
+            self.leaving[user_id] = (0, self.leaving[user_id][1])
+        await self._expire(time.monotonic())
+        # Users still connected here are gone for the other workers too.
+        self.changed.update(self.status)
+        self.status.clear()
+        try:
+            await self._publish()
+        except Exception:
+            logger.exception("Failed to publish presence of %d users", len(self.changed))
+
+    def connect(self, sid, user_id: int):
+        if sid in self.sockets:
+            self.disconnect(sid, watchers=False)
+        self.sockets[sid] = [user_id, False]
+        self.users[user_id].add(sid)
+        self.leaving.pop(user_id, None)
+        self._refresh(user_id)
+
+    def disconnect(self, sid, watchers: bool = True):
+        if watchers:
+            for user_id in self.watching.pop(sid, ()):
+                self._unwatch(sid, user_id)
+        state = self.sockets.pop(sid, None)
+        if state is None:
+            return
+        user_id = state[0]
+        self.users[user_id].discard(sid)
+        if not self.users[user_id]:
+            del self.users[user_id]
+            self.leaving[user_id] = (time.monotonic() + self.grace, datetime.now(timezone.utc))
+        else:
+            self._refresh(user_id)
+
+    def set_away(self, sid, away: bool):
+        state = self.sockets.get(sid)
+        if state is not None and state[1] != away:
+            state[1] = away
+            self._refresh(state[0])
+
+    def _refresh(self, user_id: int):
+        sids = self.users.get(user_id)
+        if not sids:
+            return
+        status = AWAY if all(self.sockets[sid][1] for sid in sids) else ONLINE
+        if self.status.get(user_id) != status:
+            self.status[user_id] = status
+            self.dirty.add(user_id)
+            self.changed.add(user_id)
+
+    def merged(self, user_id: int):
+        statuses = {self.status.get(user_id)}
+        now = time.monotonic()
+        for status, expires_at in self.remote.get(user_id, {}).values():
+            if expires_at > now:
+                statuses.add(status)
+        if ONLINE in statuses:
+            return ONLINE
+        return AWAY if AWAY in statuses else OFFLINE
+
+    def remote_update(self, data):
+        host = data["host"]
+        if host == self.host:
+            return
+        expires_at = time.monotonic() + self.remote_ttl
+        for user_id, status, last_seen in data["users"]:
+            hosts = self.remote.get(user_id, {})
+            previous = hosts.get(host, (OFFLINE,))[0]
+            if status == OFFLINE:
+                hosts.pop(host, None)
+                if last_seen:
+                    self.recently_seen.set(user_id, datetime.fromisoformat(last_seen))
+            else:
+                hosts[host] = (status, expires_at)
+            if hosts:
+                self.remote[user_id] = hosts
+            else:
+                self.remote.pop(user_id, None)
+            if status != previous and user_id in self.watchers:
+                self.dirty.add(user_id)
+
+    def subscribe(self, sid, user_ids):
+        for user_id in self.watching.get(sid, set()) - set(user_ids):
+            self._unwatch(sid, user_id)
+        self.watching[sid] = set(user_ids)
+        for user_id in user_ids:
+            self.watchers[user_id].add(sid)
+
+    def _unwatch(self, sid, user_id: int):
+        watchers = self.watchers.get(user_id)
+        if watchers is not None:
+            watchers.discard(sid)
+            if not watchers:
+                del self.watchers[user_id]
+
+    def should_forward_typing(self, sender_id: int, receiver_id: int, typing: bool):
+        key = (sender_id, receiver_id)
+        if self.typing.get(key) == typing:
+            return False
+        self.typing.set(key, typing)
+        return True
+
+    async def lookup(self, db, user_ids):
+        found, missing = {}, []
+        for user_id in user_ids:
+            status = self.merged(user_id)
+            if status != OFFLINE:
+                found[user_id] = entry(user_id, status)
+            elif user_id in self.recently_seen:
+                found[user_id] = entry(user_id, OFFLINE, self.recently_seen.get(user_id))
+            else:
+                missing.append(user_id)
+        if missing:
+            result = await db.execute(
+                select(models.User.id, models.User.last_seen_at)
+                .where(models.User.id.in_(missing))
+            )
+            for user_id, last_seen in result:
+                found[user_id] = entry(user_id, OFFLINE, last_seen)
+        return [found[user_id] for user_id in user_ids if user_id in found]
+
+    async def flush(self):
+        await self._expire(time.monotonic())
+        await self._publish()
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+        batches = defaultdict(list)
+        for user_id in dirty:
+            watchers = self.watchers.get(user_id)
+            if not watchers:
+                continue
+            status = self.merged(user_id)
+            change = entry(user_id, status, self.recently_seen.get(user_id) if status == OFFLINE else None)
+            for sid in watchers:
+                batches[sid].append(change)
+        for sid, users in batches.items():
+            await self.sio.emit("presence", {"users": users}, to=sid)
+
+    async def _publish(self):
+        if not self.changed:
+            return
+        changed, self.changed = self.changed, set()
+        users = []
+        for user_id in changed:
+            status = self.status.get(user_id, OFFLINE)
+            last_seen = self.recently_seen.get(user_id) if status == OFFLINE else None
+            users.append([user_id, status, last_seen.isoformat() if last_seen else None])
+        await realtime.signal("presence", {"host": self.host, "users": users})
+
+    async def announce(self):
+        now = time.monotonic()
+        for user_id, hosts in list(self.remote.items()):
+            for host, (_, expires_at) in list(hosts.items()):
+                if expires_at <= now:
+                    del hosts[host]
+                    if user_id in self.watchers:
+                        self.dirty.add(user_id)
+            if not hosts:
+                del self.remote[user_id]
+        if self.status:
+            users = [[user_id, status, None] for user_id, status in self.status.items()]
+            await realtime.signal("presence", {"host": self.host, "users": users})
+
+    async def _expire(self, now: float):
+        gone = [
+            (user_id, last_seen)
+            for user_id, (deadline, last_seen) in self.leaving.items()
+            if deadline <= now
+        ]
+        if not gone:
+            return
+        for user_id, last_seen in gone:
+            del self.leaving[user_id]
+            self.status.pop(user_id, None)
+            self.recently_seen.set(user_id, last_seen)
+            self.dirty.add(user_id)
+            self.changed.add(user_id)
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    update(models.User.__table__)
+                    .where(models.User.id == bindparam("user_id"))
+                    .values(last_seen_at=bindparam("seen")),
+                    [{"user_id": user_id, "seen": last_seen} for user_id, last_seen in gone],
+                )
+                await db.commit()
+        except Exception:
+            logger.exception("Failed to persist last seen for %d users", len(gone))
+
+registry = PresenceRegistry()
+realtime.on_signal("presence")(registry.remote_update)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+
+import orjson
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+import database
+import models
+from cache import TTLCache
+
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", 5000))
+PROFILE_CACHE_TTL = float(os.getenv("PROFILE_CACHE_TTL", 300))
+PROFILE_MAX_AGE = int(os.getenv("PROFILE_MAX_AGE", 30))
+
+PUBLIC_CACHE_CONTROL = f"public, max-age={PROFILE_MAX_AGE}, must-revalidate"
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+class ProfileCache:
+    def __init__(self, maxsize: int = PROFILE_CACHE_SIZE, ttl: float = PROFILE_CACHE_TTL):
+        self.entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.version = 0
+        # A replica may not have an invalidated profile's write yet; until
+        # it catches up, loads are served but not cached.
+        self.recent_writes = TTLCache(
+            maxsize=maxsize, ttl=database.READ_YOUR_WRITES_SECONDS if database.read_engines else 0
+        )
+
+    def get(self, user_id: int):
+        return self.entries.get(user_id)
+
+    def put(self, user_id: int, version: int, payload: dict):
+        body = orjson.dumps(payload)
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        # An invalidation during the load may or may not be in the payload.
+        if version == self.version and user_id not in self.recent_writes:
+            self.entries.set(user_id, (etag, body))
+        return etag, body
+
+    def invalidate(self, user_id: int):
+        self.version += 1
+        self.recent_writes.set(user_id, True)
+        self.entries.pop(user_id)
+
+cache = ProfileCache()
+
+async def load_profile(db, user_id: int):
+    entry = cache.get(user_id)
+    if entry is not None:
+        return entry
+
+    version = cache.version
+    result = await db.execute(
+        select(models.User)
+        .options(selectinload(models.User.skills))
+        .where(models.User.id == user_id)
+    )
+    user = result.scalars().first()
+    if not user:
+        return None
+
+    return cache.put(user_id, version, {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "skills": [
+            {
+                "id": s.id,
+                "name": s.name,
+                "category": s.category,
+                "description": s.description,
+            }
+            for s in user.skills
+        ],
+    })
+
+def not_modified(request: Request, etag: str):
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {c.strip().removeprefix("W/") for c in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+def profile_response(request: Request, entry, cache_control: str):
+    etag, body = entry
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
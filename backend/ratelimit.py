@@ -0,0 +1,194 @@
+import functools
+import logging
+import math
+import os
+import time
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+
+import metrics
+from auth import verify_access_token
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() not in ("0", "false", "no")
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "")
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", 64))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# name=rate/burst, rate in requests per second
+RATE_LIMITS = os.getenv(
+    "RATE_LIMITS", "search=10/30,suggest=20/40,chat=20/60,api=50/100,send_message=5/20,typing=5/10"
+)
+# path prefix=limit name, longest prefix wins; an empty name disables limiting
+RATE_LIMIT_ROUTES = os.getenv(
+    "RATE_LIMIT_ROUTES", "/search/suggest=suggest,/search=search,/chat=chat,/=api"
+)
+
+logger = logging.getLogger(__name__)
+
+def parse_limits(spec: str):
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        rate = float(rate)
+        limits[name.strip()] = (rate, float(burst or rate))
+    return limits
+
+def parse_routes(spec: str):
+    routes = []
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        prefix, _, name = item.partition("=")
+        routes.append((prefix.strip(), name.strip()))
+    return sorted(routes, key=lambda route: len(route[0]), reverse=True)
+
+# Both backends implement the token bucket as GCRA: a bucket is a single
+# "theoretical arrival time", and a key whose time has passed is a full
+# bucket that can be forgotten.
+class MemoryBackend:
+    def __init__(self, shards: int = RATE_LIMIT_SHARDS, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.shards = [{} for _ in range(shards)]
+        self.max_per_shard = max(1, max_keys // shards)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1):
+        shard = self.shards[hash(key) % len(self.shards)]
+        now = time.monotonic()
+        interval = 1 / rate
+        tat = max(shard.get(key, now), now) + interval * cost
+        allow_at = tat - interval * burst
+        if allow_at > now:
+            return allow_at - now
+        shard[key] = tat
+        if len(shard) > self.max_per_shard:
+            self._prune(shard, now)
+        return 0.0
+
+    def _prune(self, shard: dict, now: float):
+        for key in [k for k, tat in shard.items() if tat <= now]:
+            del shard[key]
+        # Still over budget: forget the oldest buckets, which only ever
+        # errs towards letting those clients through.
+        target = self.max_per_shard * 9 // 10
+        while len(shard) > target:
+            del shard[next(iter(shard))]
+
+class RedisBackend:
+    SCRIPT = """
+local now = redis.call('TIME')
+local t = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or t), t) + interval * tonumber(ARGV[3])
+local allow_at = tat - interval * tonumber(ARGV[2])
+if allow_at > t then
+    return tostring(allow_at - t)
+end
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - t) * 1000))
+return '0'
+"""
+
+    def __init__(self, url: str, prefix: str = "ratelimit:"):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1):
+        try:
+            retry = await self.script(keys=[self.prefix + key], args=[1 / rate, burst, cost])
+        except Exception:
+            # Fail open: an unavailable limiter must not take the API down with it.
+            logger.exception("Rate limit backend unavailable")
+            return 0.0
+        return float(retry)
+
+def make_backend(url: str = RATE_LIMIT_BACKEND):
+    if not url or url == "memory://":
+        return MemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported RATE_LIMIT_BACKEND: {url}")
+
+class RateLimiter:
+    def __init__(self, backend, limits: dict, routes: list, enabled: bool = True):
+        self.backend = backend
+        self.limits = limits
+        self.routes = routes
+        self.enabled = enabled
+
+    def route_limit(self, path: str):
+        for prefix, name in self.routes:
+            if path.startswith(prefix):
+                return name or None
+        return None
+
+    async def check(self, name: str, key: str):
+        """Take one token from `name` for `key`; returns seconds to wait, 0 if allowed."""
+        limit = self.limits.get(name)
+        if not self.enabled or limit is None or limit[0] <= 0:
+            return 0.0
+        retry = await self.backend.take(f"{name}:{key}", *limit)
+        if retry:
+            metrics.RATE_LIMITED.labels(name).inc()
+        return retry
+
+limiter = RateLimiter(
+    make_backend(),
+    parse_limits(RATE_LIMITS),
+    parse_routes(RATE_LIMIT_ROUTES),
+    enabled=RATE_LIMIT_ENABLED,
+)
+
+def retry_after(seconds: float):
+    return str(max(1, math.ceil(seconds)))
+
+def client_key(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                try:
+                    return f"user:{verify_access_token(token)}"
+                except HTTPException:
+                    pass
+            break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and limiter.enabled:
+            name = limiter.route_limit(scope["path"])
+            if name:
+                wait = await limiter.check(name, client_key(scope))
+                if wait:
+                    response = ORJSONResponse(
+                        {"detail": "Too many requests"},
+                        status_code=429,
+                        headers={"Retry-After": retry_after(wait)},
+                    )
+                    await response(scope, receive, send)
+                    return
+        await self.app(scope, receive, send)
+
+def socket_limit(sio, name: str):
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(sid, *args):
+            if limiter.enabled:
+                session = await sio.get_session(sid)
+                user_id = session.get("user_id")
+                key = f"user:{user_id}" if user_id is not None else f"sid:{sid}"
+                wait = await limiter.check(name, key)
+                if wait:
+                    await sio.emit(
+                        "rate_limited",
+                        {"event": name, "retry_after": round(wait, 3)},
+                        to=sid,
+                    )
+                    return
+            return await handler(sid, *args)
+        return wrapper
+    return decorator
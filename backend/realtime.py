@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import pickle
+from collections import defaultdict
+
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+SOCKETIO_MESSAGE_QUEUE = os.getenv("SOCKETIO_MESSAGE_QUEUE", "")
+SOCKETIO_CHANNEL = os.getenv("SOCKETIO_CHANNEL", "skillbarter")
+
+SIGNAL = "app_signal"
+
+logger = logging.getLogger(__name__)
+
+# App-level messages between workers (cache invalidation, presence), sent
+# over the client manager's bus. Handlers are plain functions keyed by name.
+signal_handlers = {}
+bus = None
+
+def on_signal(name: str):
+    def register(handler):
+        signal_handlers[name] = handler
+        return handler
+    return register
+
+def dispatch(name: str, data):
+    handler = signal_handlers.get(name)
+    if handler is None:
+        return
+    try:
+        handler(data)
+    except Exception:
+        logger.exception("Signal %s failed", name)
+
+async def signal(name: str, data):
+    """Runs the `name` handler on this worker and on every other worker
+    sharing the bus."""
+    dispatch(name, data)
+    if isinstance(bus, AsyncPubSubManager):
+        await bus._publish({"method": SIGNAL, "name": name, "data": data, "host_id": bus.host_id})
+
+def start(server):
+    """Joins the bus at startup rather than on the first socket connect,
+    so workers serving only HTTP receive signals too."""
+    global bus
+    bus = server.manager
+    if not server.manager_initialized:
+        server.manager_initialized = True
+        server.manager.initialize()
+
+class SignalMixin:
+    """Takes app signals out of the manager's message stream; everything
+    else goes on to python-socketio."""
+
+    async def _listen(self):
+        async for message in super()._listen():
+            data = message
+            if isinstance(message, bytes):
+                try:
+                    data = pickle.loads(message)
+                except Exception:
+                    pass
+            if isinstance(data, dict) and data.get("method") == SIGNAL:
+                if data.get("host_id") != self.host_id:
+                    dispatch(data["name"], data["data"])
+                continue
+            yield message
+
+# In-memory stand-in for a Redis bus: every manager on the same channel
+# in this process receives every other manager's messages.
+class LocalBus(AsyncPubSubManager):
+    name = "local"
+    buses = defaultdict(list)
+
+    def __init__(self, channel="socketio", write_only=False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.queue = asyncio.Queue()
+        self.buses[channel].append(self.queue)
+
+    async def _publish(self, data):
+        for queue in self.buses[self.channel]:
+            queue.put_nowait(data)
+
+    async def _listen(self):
+        while True:
+            yield await self.queue.get()
+
+class LocalPubSubManager(SignalMixin, LocalBus):
+    pass
+
+class RedisManager(SignalMixin, socketio.AsyncRedisManager):
+    pass
+
+def make_client_manager(url: str = SOCKETIO_MESSAGE_QUEUE, channel: str = SOCKETIO_CHANNEL):
+    if not url:
+        return socketio.AsyncManager()
+    if url.startswith("local://"):
+        return LocalPubSubManager(channel=channel)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisManager(url, channel=channel)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
+
+def user_room(user_id: int):
+    return f"user:{user_id}"
@@ -21,6 +21,89 @@ class SkillUpdate(BaseModel):
     description: Optional[str] = None
     category: str
 
+class WantedSkillCreate(BaseModel):
+    name: str
+    category: str
+
+class UserResponse(BaseModel):
+    id: int
+    username: str
+    email: Optional[str] = None
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class SkillResponse(BaseModel):
+    id: int
+    name: str
+    category: Optional[str] = None
+    description: Optional[str] = None
+    user_id: Optional[int] = None
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class WantedSkillResponse(BaseModel):
+    id: int
+    name: str
+    category: Optional[str] = None
+    user_id: int
+
+    model_config = {
+        "from_attributes": True
+    }
+
+class SkillOwner(BaseModel):
+    id: Optional[int] = None
+    username: Optional[str] = None
+    email: Optional[str] = None
+
+class SkillSearchResult(BaseModel):
+    id: int
+    name: str
+    description: Optional[str] = None
+    category: Optional[str] = None
+    owner: SkillOwner
+
+class CategoryFacet(BaseModel):
+    name: str
+    count: int
+
+class OwnerFacet(BaseModel):
+    user_id: int
+    username: str
+    count: int
+
+class SearchFacets(BaseModel):
+    categories: Optional[List[CategoryFacet]] = None
+    owners: Optional[List[OwnerFacet]] = None
+
+class SkillSearchPage(BaseModel):
+    items: List[SkillSearchResult]
+    next_cursor: Optional[str] = None
+    facets: Optional[SearchFacets] = None
+
+class Suggestion(BaseModel):
+    text: str
+    kind: str
+    count: int
+
+class SuggestionPage(BaseModel):
+    items: List[Suggestion]
+    ready: bool
+
+class MatchResult(BaseModel):
+    user_id: int
+    username: str
+    score: float
+
+class MatchPage(BaseModel):
+    items: List[MatchResult]
+    next_cursor: Optional[int] = None
+    ready: bool
+
 class UserSkillResponse(BaseModel):
     id: int
     name: str
@@ -49,18 +132,34 @@ class TradeRequestResponse(BaseModel):
     id: int
     sender_id: int
     receiver_id: int
-    skill_id: int
+    skill_id: Optional[int] = None
     status: str
     created_at: Optional[datetime] = None
+    skill: Optional[str] = None
+    sender: Optional[str] = None
+    receiver: Optional[str] = None
 
     model_config = {
         "from_attributes": True
     }
 
+class TradeRequestCursors(BaseModel):
+    received: Optional[int] = None
+    sent: Optional[int] = None
+
+class TradeRequestList(BaseModel):
+    received: List[TradeRequestResponse] = []
+    sent: List[TradeRequestResponse] = []
+    next_cursor: TradeRequestCursors
+
+class TradeRequestCounts(BaseModel):
+    pending_received: int
+    pending_sent: int
+
 class ChatMessageBase(BaseModel):
     sender_id: int
     receiver_id: int
-    request_id: int
+    request_id: Optional[int] = None
     message: str
 
 class ChatMessageCreate(ChatMessageBase):
@@ -74,3 +173,27 @@ class ChatMessageOut(ChatMessageBase):
     model_config = {
         "from_attributes": True
     }
+
+class ChatMessagePage(BaseModel):
+    messages: List[ChatMessageOut]
+    next_cursor: Optional[int] = None
+
+class ConversationSummary(BaseModel):
+    conversation_key: str
+    partner_id: int
+    partner_username: str
+    latest_message: str
+    timestamp: Optional[datetime] = None
+    unread_count: int
+
+class ConversationPage(BaseModel):
+    conversations: List[ConversationSummary]
+    next_cursor: Optional[str] = None
+
+class PresenceEntry(BaseModel):
+    user_id: int
+    status: str
+    last_seen: Optional[datetime] = None
+
+class PresencePage(BaseModel):
+    users: List[PresenceEntry]
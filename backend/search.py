@@ -0,0 +1,71 @@
+import base64
+import json
+import re
+
+from fastapi import HTTPException
+from sqlalchemy import and_, func, literal_column, or_
+
+import models
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+search_document = literal_column(models.SKILL_SEARCH_DOCUMENT)
+
+def build_tsquery(q: str):
+    terms = re.findall(r"\w+", q.lower())
+    if not terms:
+        return None
+    return " & ".join(f"{t}:*" for t in terms)
+
+def encode_cursor(rank, skill_id):
+    raw = json.dumps([rank, skill_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str):
+    try:
+        rank, skill_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if rank is not None:
+            rank = float(rank)
+        return rank, int(skill_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def clamp_limit(limit: int):
+    return max(1, min(limit, MAX_LIMIT))
+
+def apply_search(query, q: str, category: str, cursor: str, limit: int):
+    tsquery = build_tsquery(q)
+    if category:
+        query = query.where(func.lower(models.Skill.category) == category.strip().lower())
+
+    position = decode_cursor(cursor) if cursor else None
+    if position and (position[0] is None) != (tsquery is None):
+        # A cursor from a ranked search cannot continue an unranked one.
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if tsquery is None:
+        rank = None
+        if position:
+            query = query.where(models.Skill.id > position[1])
+        query = query.order_by(models.Skill.id.asc())
+    else:
+        match = func.to_tsquery(literal_column("'simple'"), tsquery)
+        rank = func.ts_rank_cd(search_document, match)
+        query = query.add_columns(rank.label("rank")).where(search_document.op("@@")(match))
+        if position:
+            query = query.where(
+                or_(
+                    rank < position[0],
+                    and_(rank == position[0], models.Skill.id > position[1]),
+                )
+            )
+        query = query.order_by(rank.desc(), models.Skill.id.asc())
+
+    return query.limit(limit + 1), rank is not None
+
+def next_cursor(rows, limit: int, ranked: bool):
+    if len(rows) <= limit:
+        return None
+    last = rows[limit - 1]
+    return encode_cursor(last.rank if ranked else None, last.id)
@@ -0,0 +1,175 @@
+import asyncio
+import heapq
+import os
+from collections import defaultdict
+from bisect import bisect_left, insort
+
+from sqlalchemy import func, select
+
+import models
+from cache import TTLCache
+from database import read_session
+from tasks import PeriodicTask
+
+SUGGEST_REBUILD_SECONDS = float(os.getenv("SUGGEST_REBUILD_SECONDS", 600))
+SUGGEST_CACHE_SIZE = int(os.getenv("SUGGEST_CACHE_SIZE", 4096))
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# Prefixes this short match a large share of all keys; their results are
+# computed at build time and always kept.
+SHORT_PREFIX = 2
+KINDS = ("skill", "category")
+# Sorts after any character a key can contain, so (prefix + END) bounds the
+# range of keys starting with prefix.
+END = "\U0010ffff"
+
+def normalize(text: str):
+    return " ".join((text or "").lower().split())
+
+def search_keys(term: str):
+    """The term and each of its word suffixes, so "web development" is found
+    by "we" and by "dev"."""
+    words = term.split(" ")
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+def rank(entries, match):
+    return (-entries[match][1], match[1])
+
+def best(entries, matches):
+    return heapq.nsmallest(MAX_LIMIT, matches, key=lambda match: rank(entries, match))
+
+def short_tops(keys, entries):
+    candidates = defaultdict(set)
+    for key, kind, term in keys:
+        for end in range(1, min(len(key), SHORT_PREFIX) + 1):
+            candidates[(key[:end], kind)].add((kind, term))
+            candidates[(key[:end], None)].add((kind, term))
+    return {prefix: best(entries, matches) for prefix, matches in candidates.items()}
+
+class SuggestIndex:
+    """Distinct skill names and categories kept as a sorted key list.
+
+    A lookup bisects to the keys starting with the prefix and keeps the most
+    frequent terms; results are cached per prefix and updated in place as
+    skills are added. A periodic rebuild picks up deletes and skills written
+    by other workers.
+    """
+
+    def __init__(self, session_factory=read_session, rebuild_seconds: float = SUGGEST_REBUILD_SECONDS,
+                 cache_size: int = SUGGEST_CACHE_SIZE):
+        self.session_factory = session_factory
+        self.rebuild_seconds = rebuild_seconds
+        self.entries = {}
+        self.keys = []
+        self.short = {}
+        self.top = TTLCache(maxsize=cache_size, ttl=rebuild_seconds)
+        self.pending = None
+        self.ready = False
+        self.rebuilder = PeriodicTask("Suggest index rebuild", self.rebuild, rebuild_seconds)
+
+    async def _load(self):
+        counts = {}
+        async with self.session_factory() as db:
+            for kind, column in zip(KINDS, (models.Skill.name, models.Skill.category)):
+                result = await db.stream(
+                    select(column, func.count()).group_by(column).execution_options(yield_per=5000)
+                )
+                async for label, count in result:
+                    term = normalize(label)
+                    if not term:
+                        continue
+                    entry = counts.get((kind, term))
+                    if entry is None:
+                        counts[(kind, term)] = [label.strip(), count]
+                    else:
+                        entry[1] += count
+        return counts
+
+    @staticmethod
+    def _build(entries):
+        keys = sorted((key, kind, term) for kind, term in entries for key in search_keys(term))
+        return keys, short_tops(keys, entries)
+
+    async def rebuild(self):
+        self.pending = []
+        try:
+            entries = await self._load()
+            keys, short = await asyncio.to_thread(self._build, entries)
+        except BaseException:
+            self.pending = None
+            raise
+        pending, self.pending = self.pending, None
+        self.entries, self.keys, self.short = entries, keys, short
+        self.top.clear()
+        # Skills added while loading may be missing from a lagging replica;
+        # only terms the load did not see are re-applied, so counts never
+        # double.
+        for kind, label in pending:
+            if (kind, normalize(label)) not in entries:
+                self._add(kind, label)
+        self.ready = True
+
+    def add(self, name: str, category: str = None):
+        for kind, label in zip(KINDS, (name, category)):
+            if self.pending is not None:
+                self.pending.append((kind, label))
+            self._add(kind, label)
+
+    def _add(self, kind: str, label: str):
+        term = normalize(label)
+        if not term:
+            return
+        match = (kind, term)
+        entry = self.entries.get(match)
+        keys = search_keys(term)
+        if entry is None:
+            self.entries[match] = [label.strip(), 1]
+            for key in keys:
+                insort(self.keys, (key, kind, term))
+        else:
+            entry[1] += 1
+        # Counts only grow between rebuilds, so a cached list stays exact by
+        # re-placing this one term in it.
+        for key in keys:
+            for end in range(1, len(key) + 1):
+                for prefix in ((key[:end], kind), (key[:end], None)):
+                    top = self.short.get(prefix) if end <= SHORT_PREFIX else self.top.get(prefix)
+                    if top is not None:
+                        self._place(top, match)
+
+    def _place(self, top, match):
+        if match not in top:
+            if len(top) >= MAX_LIMIT and rank(self.entries, match) >= rank(self.entries, top[-1]):
+                return
+            top.append(match)
+        top.sort(key=lambda m: rank(self.entries, m))
+        del top[MAX_LIMIT:]
+
+    def suggest(self, prefix: str, kind: str = None, limit: int = DEFAULT_LIMIT):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        cache = self.short if len(prefix) <= SHORT_PREFIX else self.top
+        top = cache.get((prefix, kind))
+        if top is None:
+            top = self._top(prefix, kind)
+            if cache is self.short:
+                cache[(prefix, kind)] = top
+            else:
+                cache.set((prefix, kind), top)
+        return [
+            {"text": self.entries[match][0], "kind": match[0], "count": self.entries[match][1]}
+            for match in top[:limit]
+        ]
+
+    def _top(self, prefix: str, kind: str):
+        lo = bisect_left(self.keys, (prefix,))
+        hi = bisect_left(self.keys, (prefix + END,), lo)
+        return best(self.entries, {
+            (entry_kind, term)
+            for _, entry_kind, term in self.keys[lo:hi]
+            if kind is None or entry_kind == kind
+        })
+
+index = SuggestIndex()
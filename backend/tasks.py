@@ -0,0 +1,43 @@
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class PeriodicTask:
+    """Awaits `tick()` every `interval` seconds in a background task.
+
+    A failing tick is logged and the loop carries on. With `delay_first`
+    the first tick waits one interval, for work that only exists once
+    something has happened (pending acks, presence changes).
+    """
+
+    def __init__(self, name: str, tick, interval: float, delay_first: bool = False):
+        self.name = name
+        self.tick = tick
+        self.interval = interval
+        self.delay_first = delay_first
+        self.task = None
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+    async def _run(self):
+        if self.delay_first:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("%s failed", self.name)
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,45 @@
+import asyncio
+
+import bulk
+
+CSV = (
+    'name,category,description\r\n'
+    'Python,Programming,"Async, typing\r\nand ""packaging"""\r\n'
+    '"Guitar, acoustic",Music,"Line one\n\nLine three"\n'
+    'Monitors,Hardware,27" screen\n'
+    'Baking,Cooking,plain\n'
+)
+
+async def chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+def parse(text: str, size: int = 7):
+    async def collect():
+        lines = bulk.iter_lines(chunks(text.encode(), size))
+        return [row async for row in bulk.iter_csv_rows(lines)]
+    return asyncio.run(collect())
+
+def test_quoted_fields_span_lines():
+    for size in (1, 7, len(CSV)):
+        assert parse(CSV, size) == [
+            (2, {"name": "Python", "category": "Programming",
+                 "description": 'Async, typing\nand "packaging"'}),
+            (4, {"name": "Guitar, acoustic", "category": "Music",
+                 "description": "Line one\n\nLine three"}),
+            (7, {"name": "Monitors", "category": "Hardware", "description": '27" screen'}),
+            (8, {"name": "Baking", "category": "Cooking", "description": "plain"}),
+        ]
+
+def test_bad_records_are_line_errors():
+    rows = parse(
+        'name,category\n'
+        '"Bad"quote,Music\n'
+        'Rust,Programming\n'
+        'Open,"never closed\n'
+        'more\n'
+    )
+    assert [line for line, _ in rows] == [2, 3, 4]
+    assert isinstance(rows[0][1], Exception)
+    assert rows[1][1] == {"name": "Rust", "category": "Programming"}
+    assert isinstance(rows[2][1], ValueError)
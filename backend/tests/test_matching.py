@@ -0,0 +1,54 @@
+import asyncio
+import random
+
+import matching
+
+CATEGORIES = ["Programming", "Design", "Music", "Cooking"]
+WORDS = ["python", "react", "guitar", "piano", "spanish", "baking", "yoga", "figma", "rust", "sql"]
+
+class FakeIndex(matching.MatchIndex):
+    def __init__(self, skills, per_user):
+        super().__init__(per_user=per_user)
+        self.skills = skills
+
+    async def _load(self, user_ids=None):
+        teach, wants = {}, {}
+        for user_id, (taught, wanted) in self.skills.items():
+            if user_ids is not None and user_id not in user_ids:
+                continue
+            for rows, target in ((taught, teach), (wanted, wants)):
+                features = {}
+                for name, category in rows:
+                    for feature, weight in matching.skill_features(name, category).items():
+                        features[feature] = max(weight, features.get(feature, 0))
+                if features:
+                    target[user_id] = features
+        return teach, wants
+
+def random_skills(rng):
+    return [(rng.choice(WORDS).title(), rng.choice(CATEGORIES)) for _ in range(rng.randint(0, 3))]
+
+def snapshot(index):
+    return {
+        user_id: (partners.tolist(), scores.tolist())
+        for user_id, (partners, scores) in index.matches.items()
+    }
+
+def test_refresh_matches_rebuild():
+    rng = random.Random(7)
+    skills = {user_id: (random_skills(rng), random_skills(rng)) for user_id in range(1, 183)}
+
+    async def run():
+        index = FakeIndex(skills, per_user=5)
+        await index.rebuild()
+        for _ in range(20):
+            for user_id in rng.sample(sorted(skills), 4):
+                skills[user_id] = (random_skills(rng), random_skills(rng))
+                index.mark_dirty(user_id)
+            await index.refresh()
+
+            expected = FakeIndex(skills, per_user=5)
+            await expected.rebuild()
+            assert snapshot(index) == snapshot(expected)
+
+    asyncio.run(run())
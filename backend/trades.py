@@ -0,0 +1,125 @@
+import os
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import aliased
+
+import models
+import realtime
+from cache import TTLCache
+from database import AsyncSessionLocal
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+DIRECTIONS = ("received", "sent")
+STATUSES = ("pending", "accepted", "rejected")
+
+# Participants of accepted trades, keyed by request id. Only accepted trades
+# are cached; a rejection is signalled to every worker, and the TTL bounds
+# how long a lost signal can leave a rejected trade open.
+accepted_trades = TTLCache(
+    maxsize=int(os.getenv("TRADE_PERMISSION_CACHE_SIZE", 10000)),
+    ttl=float(os.getenv("TRADE_PERMISSION_CACHE_TTL", 60)),
+)
+revocations = 0
+
+def remember_accepted(request_id: int, sender_id: int, receiver_id: int):
+    accepted_trades.set(request_id, frozenset((sender_id, receiver_id)))
+
+async def forget(request_id: int):
+    await realtime.signal("trade_rejected", request_id)
+
+@realtime.on_signal("trade_rejected")
+def _revoke(request_id: int):
+    global revocations
+    revocations += 1
+    accepted_trades.pop(request_id)
+
+async def can_chat(request_id: int, sender_id: int, receiver_id: int):
+    participants = accepted_trades.get(request_id)
+    if participants is None:
+        seen = revocations
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(models.TradeRequest.sender_id, models.TradeRequest.receiver_id).where(
+                    models.TradeRequest.id == request_id,
+                    models.TradeRequest.status == "accepted",
+                )
+            )
+        row = result.first()
+        if row is None:
+            return False
+        participants = frozenset(row)
+        # A rejection signalled during the load may not be in the result.
+        if seen == revocations:
+            remember_accepted(request_id, *row)
+    return participants == frozenset((sender_id, receiver_id))
+
+def request_columns():
+    sender = aliased(models.User)
+    receiver = aliased(models.User)
+    trade = models.TradeRequest
+    return (
+        select(
+            trade.id,
+            trade.status,
+            trade.sender_id,
+            trade.receiver_id,
+            trade.skill_id,
+            trade.created_at,
+            models.Skill.name.label("skill"),
+            sender.username.label("sender"),
+            receiver.username.label("receiver"),
+        )
+        .outerjoin(models.Skill, models.Skill.id == trade.skill_id)
+        .outerjoin(sender, sender.id == trade.sender_id)
+        .outerjoin(receiver, receiver.id == trade.receiver_id)
+    )
+
+def validate_filters(direction, status, before_id):
+    if direction is not None and direction not in DIRECTIONS:
+        raise HTTPException(status_code=400, detail="direction must be 'received' or 'sent'")
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=400, detail="Unknown status")
+    if before_id is not None and direction is None:
+        raise HTTPException(status_code=400, detail="before_id requires a direction")
+
+async def fetch_page(db, user_id: int, direction: str, status=None, before_id=None,
+                     limit=DEFAULT_PAGE_SIZE):
+    trade = models.TradeRequest
+    owner = trade.receiver_id if direction == "received" else trade.sender_id
+    query = request_columns().where(owner == user_id)
+    if status is not None:
+        query = query.where(trade.status == status)
+    if before_id is not None:
+        query = query.where(trade.id < before_id)
+
+    result = await db.execute(query.order_by(trade.id.desc()).limit(limit + 1))
+    rows = result.all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+async def fetch_one(db, user_id: int, request_id: int):
+    trade = models.TradeRequest
+    result = await db.execute(
+        request_columns().where(
+            trade.id == request_id,
+            or_(trade.sender_id == user_id, trade.receiver_id == user_id),
+        )
+    )
+    return result.first()
+
+async def pending_counts(db, user_id: int):
+    trade = models.TradeRequest
+    result = await db.execute(
+        select(
+            func.count().filter(trade.receiver_id == user_id),
+            func.count().filter(trade.sender_id == user_id),
+        ).where(
+            trade.status == "pending",
+            or_(trade.receiver_id == user_id, trade.sender_id == user_id),
+        )
+    )
+    received, sent = result.one()
+    return {"pending_received": received, "pending_sent": sent}
@@ -1,10 +1,38 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Link, useNavigate } from "react-router-dom";
+import API from "../services/api";
+
+const COUNTS_POLL_MS = 30000;
 
 export default function Navbar() {
   const token = localStorage.getItem("token");
   const navigate = useNavigate();
   const [open, setOpen] = useState(false);
+  const [pending, setPending] = useState(0);
+
+  useEffect(() => {
+    if (!token) return;
+    const fetchCounts = async () => {
+      try {
+        const res = await API.get("/trade/requests/counts");
+        setPending(res.data?.pending_received || 0);
+      } catch (err) {
+        console.error("Error fetching request counts:", err.message);
+      }
+    };
+    fetchCounts();
+    const timer = setInterval(fetchCounts, COUNTS_POLL_MS);
+    return () => clearInterval(timer);
+  }, [token]);
+
+  const requestsLabel = (
+    <>
+      Requests
+      {pending > 0 && (
+        <span className="ml-1 bg-red-500 text-white text-xs rounded-full px-2">{pending}</span>
+      )}
+    </>
+  );
 
   const logout = () => {
     localStorage.removeItem("token");
@@ -18,7 +46,7 @@ export default function Navbar() {
           <Link to="/" className="font-bold text-xl text-gray-800">SkillBarter</Link>
           <div className="hidden md:flex items-center gap-3 text-sm text-gray-600">
             {token && <Link to="/dashboard" className="hover:text-gray-900">Dashboard</Link>}
-            {token && <Link to="/requests" className="hover:text-gray-900">Requests</Link>}
+            {token && <Link to="/requests" className="hover:text-gray-900">{requestsLabel}</Link>}
             {token && <Link to="/search" className="hover:text-gray-900">Search</Link>}
             {token && <Link to="/profile" className="hover:text-gray-900">Profile</Link>}
             {token && <Link to="/messages" className="hover:text-gray-900">Messages</Link>}
@@ -53,7 +81,7 @@ export default function Navbar() {
         <div className="md:hidden border-t bg-white">
           <div className="p-3 flex flex-col gap-2">
             {token && <Link to="/dashboard" className="py-1 px-2 rounded hover:bg-gray-50">Dashboard</Link>}
-            {token && <Link to="/requests" className="py-1 px-2 rounded hover:bg-gray-50">Requests</Link>}
+            {token && <Link to="/requests" className="py-1 px-2 rounded hover:bg-gray-50">{requestsLabel}</Link>}
             {token && <Link to="/search" className="py-1 px-2 rounded hover:bg-gray-50">Search</Link>}
             {token && <Link to="/profile" className="py-1 px-2 rounded hover:bg-gray-50">Profile</Link>}
             {token && <Link to="/messages" className="py-1 px-2 rounded hover:bg-gray-50">Messages</Link>}
@@ -8,6 +8,7 @@ const SOCKET_URL = process.env.REACT_APP_API_URL || "http://localhost:8000";
 const ChatPage = ({ currentUser }) => {
   const { requestId } = useParams();
   const [messages, setMessages] = useState([]);
+  const [olderCursor, setOlderCursor] = useState(null);
   const [input, setInput] = useState("");
   const [receiverId, setReceiverId] = useState(null);
   const socketRef = useRef(null);
@@ -38,7 +39,25 @@ const ChatPage = ({ currentUser }) => {
 
     socket.on("receive_message", (msg) => {
       console.log("Received message:", msg);
-      setMessages((prev) => [...prev, msg]);
+      setMessages((prev) =>
+        prev.find((m) => m.id === msg.id) ? prev : [...prev, msg]
+      );
+      if (msg.receiver_id === currentUser?.id) {
+        socket.emit("ack_delivered", { up_to: msg.id });
+      }
+    });
+
+    socket.on("catch_up", ({ messages: missed = [] }) => {
+      const mine = missed.filter((m) => m.request_id === Number(requestId));
+      if (mine.length) {
+        setMessages((prev) => {
+          const seen = new Set(prev.map((m) => m.id));
+          return [...prev, ...mine.filter((m) => !seen.has(m.id))];
+        });
+      }
+      if (missed.length) {
+        socket.emit("ack_delivered", { up_to: missed[missed.length - 1].id });
+      }
     });
 
     socket.on("message_sent", (msg) => {
@@ -53,6 +72,11 @@ const ChatPage = ({ currentUser }) => {
       alert(err?.error || "Message failed to send");
     });
 
+    socket.on("rate_limited", (err) => {
+      console.warn("Rate limited:", err);
+      alert(`You're sending messages too quickly. Try again in ${Math.ceil(err?.retry_after || 1)}s.`);
+    });
+
     socket.on("disconnect", (reason) => {
       console.warn("Socket disconnected:", reason);
     });
@@ -60,14 +84,15 @@ const ChatPage = ({ currentUser }) => {
     return () => {
       socket.disconnect();
     };
-  }, [token]);
+  }, [token, requestId, currentUser]);
 
   useEffect(() => {
     const loadChat = async () => {
       try {
         const res = await API.get(`/chat/${requestId}`);
-        const data = Array.isArray(res.data) ? res.data : [];
+        const data = res.data?.messages || [];
         setMessages(data);
+        setOlderCursor(res.data?.next_cursor || null);
 
         const firstMsg = data.find((m) => m.sender_id !== currentUser?.id);
         if (firstMsg) setReceiverId(firstMsg.sender_id);
@@ -82,9 +107,8 @@ const ChatPage = ({ currentUser }) => {
     const fetchReceiver = async () => {
       if (receiverId || !requestId) return;
       try {
-        const res = await API.get("/trade/requests");
-        const all = [...res.data.sent, ...res.data.received];
-        const match = all.find((r) => r.id === Number(requestId));
+        const res = await API.get(`/trade/requests/${requestId}`);
+        const match = res.data;
         if (match) {
           const otherId =
             match.sender_id === currentUser?.id
@@ -99,13 +123,25 @@ const ChatPage = ({ currentUser }) => {
     fetchReceiver();
   }, [receiverId, requestId, currentUser]);
 
+  const loadOlder = async () => {
+    if (!olderCursor) return;
+    try {
+      const res = await API.get(`/chat/${requestId}`, {
+        params: { before_id: olderCursor },
+      });
+      setMessages((prev) => [...(res.data?.messages || []), ...prev]);
+      setOlderCursor(res.data?.next_cursor || null);
+    } catch (err) {
+      console.error("Failed to load older messages:", err.message);
+    }
+  };
+
   const handleSend = () => {
     console.log("ReceiverID:", receiverId, "RequestID:", requestId);
     if (!input.trim()) return alert("Message cannot be empty.");
     if (!receiverId) return alert("Receiver not identified yet.");
 
     const msgData = {
-      token,
       receiver_id: receiverId,
       request_id: Number(requestId),
       message: input.trim(),
@@ -123,6 +159,16 @@ const ChatPage = ({ currentUser }) => {
       </header>
 
       <div className="flex-1 overflow-y-auto p-4 space-y-3">
+        {olderCursor && (
+          <div className="flex justify-center">
+            <button
+              onClick={loadOlder}
+              className="text-sm text-blue-600 hover:underline"
+            >
+              Load older messages
+            </button>
+          </div>
+        )}
         {messages.map((m) => (
           <div
             key={m.id || Math.random()}
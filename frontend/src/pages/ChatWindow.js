@@ -16,9 +16,16 @@ function formatTime(iso) {
 export default function ChatWindow() {
   const { userId } = useParams();
   const [messages, setMessages] = useState([]);
+  const [olderCursor, setOlderCursor] = useState(null);
   const [text, setText] = useState("");
   const [currentUser, setCurrentUser] = useState(null);
   const [chatUser, setChatUser] = useState(null);
+  const [partnerStatus, setPartnerStatus] = useState(null);
+  const [partnerTyping, setPartnerTyping] = useState(false);
+  const [notice, setNotice] = useState("");
+  const noticeTimerRef = useRef(null);
+  const typingSentRef = useRef(0);
+  const typingTimerRef = useRef(null);
   const socketRef = useRef(null);
   const token = localStorage.getItem("token");
   const endRef = useRef(null);
@@ -49,21 +56,80 @@ export default function ChatWindow() {
 
   useEffect(() => {
     API.get(`/chat/user/${userId}`)
-      .then((res) => setMessages(res.data || []))
+      .then((res) => {
+        setMessages(res.data?.messages || []);
+        setOlderCursor(res.data?.next_cursor || null);
+        return API.post(`/chat/user/${userId}/read`);
+      })
       .catch((err) => console.error("Error loading chat:", err));
   }, [userId]);
 
+  const loadOlder = () => {
+    if (!olderCursor) return;
+    API.get(`/chat/user/${userId}`, { params: { before_id: olderCursor } })
+      .then((res) => {
+        setMessages((prev) => [...(res.data?.messages || []), ...prev]);
+        setOlderCursor(res.data?.next_cursor || null);
+      })
+      .catch((err) => console.error("Error loading older messages:", err));
+  };
+
   useEffect(() => {
     socketRef.current = io("http://localhost:8000", { transports: ["websocket"] });
 
-    socketRef.current.emit("register", { token });
+    const inThisChat = (msg) =>
+      msg.sender_id === Number(userId) || msg.receiver_id === Number(userId);
+
+    // Register on every (re)connect so the server replays what was missed.
+    socketRef.current.on("connect", () => {
+      socketRef.current.emit("register", { token });
+      socketRef.current.emit("presence_subscribe", { user_ids: [Number(userId)] });
+    });
+
+    socketRef.current.on("presence", ({ users = [] }) => {
+      const partner = users.find((u) => u.user_id === Number(userId));
+      if (partner) setPartnerStatus(partner);
+    });
+
+    socketRef.current.on("typing", (data) => {
+      if (data.user_id !== Number(userId)) return;
+      setPartnerTyping(data.typing);
+      clearTimeout(typingTimerRef.current);
+      if (data.typing) {
+        typingTimerRef.current = setTimeout(() => setPartnerTyping(false), 5000);
+      }
+    });
+
+    const onVisibility = () =>
+      socketRef.current.emit("set_presence", {
+        status: document.hidden ? "away" : "online",
+      });
+    document.addEventListener("visibilitychange", onVisibility);
 
     socketRef.current.on("receive_message", (msg) => {
-      if (
-        msg.sender_id === Number(userId) ||
-        msg.receiver_id === Number(userId)
-      ) {
-        setMessages((prev) => [...prev, msg]);
+      if (inThisChat(msg)) {
+        if (msg.sender_id === Number(userId)) setPartnerTyping(false);
+        setMessages((prev) =>
+          prev.find((m) => m.id === msg.id) ? prev : [...prev, msg]
+        );
+      }
+      if (msg.sender_id !== msg.receiver_id && msg.sender_id === Number(userId)) {
+        socketRef.current.emit("ack_delivered", { up_to: msg.id });
+        socketRef.current.emit("ack_read", { user_id: Number(userId) });
+      }
+    });
+
+    socketRef.current.on("catch_up", ({ messages: missed = [] }) => {
+      const mine = missed.filter(inThisChat);
+      if (mine.length) {
+        setMessages((prev) => {
+          const seen = new Set(prev.map((m) => m.id));
+          return [...prev, ...mine.filter((m) => !seen.has(m.id))];
+        });
+        socketRef.current.emit("ack_read", { user_id: Number(userId) });
+      }
+      if (missed.length) {
+        socketRef.current.emit("ack_delivered", { up_to: missed[missed.length - 1].id });
       }
     });
 
@@ -80,18 +146,43 @@ export default function ChatWindow() {
       console.error("Message error:", err);
     });
 
+    // Sends are handled in order, so a throttled send is the oldest message
+    // still waiting for its message_sent.
+    socketRef.current.on("rate_limited", (err) => {
+      if (err?.event !== "send_message") return;
+      const wait = Math.ceil(err.retry_after || 1);
+      setMessages((prev) => {
+        const i = prev.findIndex((m) => m.temp);
+        if (i === -1) return prev;
+        const failed = { ...prev[i], temp: false, failed: true };
+        return [...prev.slice(0, i), failed, ...prev.slice(i + 1)];
+      });
+      setNotice(`You're sending messages too quickly. Try again in ${wait}s.`);
+      clearTimeout(noticeTimerRef.current);
+      noticeTimerRef.current = setTimeout(() => setNotice(""), wait * 1000);
+    });
+
     return () => {
+      document.removeEventListener("visibilitychange", onVisibility);
+      clearTimeout(typingTimerRef.current);
+      clearTimeout(noticeTimerRef.current);
       socketRef.current.disconnect();
     };
   }, [userId, token]);
 
-  const sendMessage = () => {
-    if (!text.trim() || !currentUser) return;
+  const handleTyping = (value) => {
+    setText(value);
+    const now = Date.now();
+    if (value && now - typingSentRef.current > 2000) {
+      typingSentRef.current = now;
+      socketRef.current?.emit("typing", { to: Number(userId), typing: true });
+    }
+  };
 
+  const send = (message) => {
     const messageData = {
-      token,
       receiver_id: Number(userId),
-      message: text,
+      message,
       request_id: null,
     };
 
@@ -102,14 +193,27 @@ export default function ChatWindow() {
       {
         sender_id: currentUser.id,
         receiver_id: Number(userId),
-        message: text,
+        message,
         timestamp: new Date().toISOString(),
         temp: true,
       },
     ]);
+  };
+
+  const sendMessage = () => {
+    if (!text.trim() || !currentUser) return;
+
+    send(text);
+    socketRef.current.emit("typing", { to: Number(userId), typing: false });
+    typingSentRef.current = 0;
     setText("");
   };
 
+  const retry = (failed) => {
+    setMessages((prev) => prev.filter((m) => m !== failed));
+    send(failed.message);
+  };
+
   return (
     <div className="flex flex-col h-screen bg-gray-50">
       <header className="p-4 bg-white shadow flex items-center gap-3">
@@ -125,8 +229,19 @@ export default function ChatWindow() {
           <div className="w-10 h-10 rounded-full bg-gray-200" />
         )}
 
-        <div className="text-lg font-semibold text-gray-800">
-          {chatUser ? `@${chatUser.username}` : `Loading...`}
+        <div>
+          <div className="text-lg font-semibold text-gray-800">
+            {chatUser ? `@${chatUser.username}` : `Loading...`}
+          </div>
+          <div className="text-xs text-gray-500">
+            {partnerTyping
+              ? "typing..."
+              : partnerStatus?.status === "offline"
+              ? partnerStatus.last_seen
+                ? `last seen ${new Date(partnerStatus.last_seen).toLocaleString()}`
+                : "offline"
+              : partnerStatus?.status || ""}
+          </div>
         </div>
       </header>
 
@@ -134,6 +249,16 @@ export default function ChatWindow() {
         id="chat-scroll-container"
         className="flex-1 overflow-y-auto p-4 space-y-3 pb-20"
       >
+        {olderCursor && (
+          <div className="flex justify-center">
+            <button
+              onClick={loadOlder}
+              className="text-sm text-blue-600 hover:underline"
+            >
+              Load older messages
+            </button>
+          </div>
+        )}
         {messages.map((m, i) => {
           const isMine = m.sender_id === currentUser?.id;
           return (
@@ -150,6 +275,14 @@ export default function ChatWindow() {
                 <div className="text-xs text-black-600 mt-2 text-right">
                   {formatTime(m.timestamp)}
                 </div>
+                {m.failed && (
+                  <button
+                    onClick={() => retry(m)}
+                    className="text-xs underline mt-1"
+                  >
+                    Not sent · Retry
+                  </button>
+                )}
               </div>
             </div>
           );
@@ -158,11 +291,16 @@ export default function ChatWindow() {
       </div>
 
       <footer className="p-3 bg-white border-t sticky bottom-0">
+        {notice && (
+          <div className="max-w-3xl mx-auto mb-2 text-sm text-red-600">
+            {notice}
+          </div>
+        )}
         <div className="max-w-3xl mx-auto flex items-center gap-2">
           <input
             type="text"
             value={text}
-            onChange={(e) => setText(e.target.value)}
+            onChange={(e) => handleTyping(e.target.value)}
             onKeyDown={(e) => e.key === "Enter" && sendMessage()}
             className="flex-1 border rounded-full px-4 py-2 shadow-sm focus:outline-none focus:ring focus:ring-blue-200"
             placeholder={`Message @${chatUser?.username || userId}...`}
@@ -1,9 +1,10 @@
 import React, { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
-import API from "../services/api";
+import API, { getPresence } from "../services/api";
 
 export default function MessagesList() {
   const [conversations, setConversations] = useState([]);
+  const [presence, setPresence] = useState({});
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -12,6 +13,17 @@ export default function MessagesList() {
       .catch((err) => console.error("Error loading conversations:", err));
   }, []);
 
+  useEffect(() => {
+    if (conversations.length === 0) return;
+    getPresence(conversations.map((c) => c.partner_id))
+      .then((res) => {
+        const byId = {};
+        (res.data.users || []).forEach((u) => (byId[u.user_id] = u.status));
+        setPresence(byId);
+      })
+      .catch((err) => console.error("Error loading presence:", err));
+  }, [conversations]);
+
   return (
     <div className="p-6 bg-gray-50 min-h-screen">
       <h1 className="text-3xl font-bold text-center mb-6 text-gray-800">
@@ -29,19 +41,36 @@ export default function MessagesList() {
               className="flex justify-between items-center bg-white border rounded-xl p-4 shadow-sm hover:bg-gray-100 cursor-pointer transition"
             >
               <div>
-                <p className="font-semibold text-lg">@{c.partner_username}</p>
+                <p className="font-semibold text-lg flex items-center gap-2">
+                  @{c.partner_username}
+                  {presence[c.partner_id] && presence[c.partner_id] !== "offline" && (
+                    <span
+                      title={presence[c.partner_id]}
+                      className={`inline-block w-2 h-2 rounded-full ${
+                        presence[c.partner_id] === "online" ? "bg-green-500" : "bg-yellow-400"
+                      }`}
+                    />
+                  )}
+                </p>
                 <p className="text-gray-600 text-sm truncate w-64">
                   {c.latest_message || "No messages yet"}
                 </p>
               </div>
-              <p className="text-xs text-gray-400">
-                {c.timestamp
-                  ? new Date(c.timestamp).toLocaleTimeString([], {
-                      hour: "2-digit",
-                      minute: "2-digit",
-                    })
-                  : ""}
-              </p>
+              <div className="flex flex-col items-end gap-1">
+                <p className="text-xs text-gray-400">
+                  {c.timestamp
+                    ? new Date(c.timestamp).toLocaleTimeString([], {
+                        hour: "2-digit",
+                        minute: "2-digit",
+                      })
+                    : ""}
+                </p>
+                {c.unread_count > 0 && (
+                  <span className="bg-blue-600 text-white text-xs font-semibold rounded-full px-2 py-0.5">
+                    {c.unread_count}
+                  </span>
+                )}
+              </div>
             </div>
           ))}
         </div>
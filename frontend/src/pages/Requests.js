@@ -4,6 +4,7 @@ import { Link, useNavigate } from "react-router-dom";
 
 function Requests() {
   const [requests, setRequests] = useState({ received: [], sent: [] });
+  const [cursors, setCursors] = useState({ received: null, sent: null });
   const [loading, setLoading] = useState(false);
   const [currentUser, setCurrentUser] = useState(null);
 
@@ -16,19 +17,25 @@ function Requests() {
     headers: { Authorization: `Bearer ${token}` },
   });
 
+  const fetchPage = async (direction, beforeId) => {
+    const res = await api.get("/trade/requests", {
+      params: { direction, before_id: beforeId || undefined },
+    });
+    return {
+      items: Array.isArray(res.data?.[direction]) ? res.data[direction] : [],
+      cursor: res.data?.next_cursor?.[direction] || null,
+    };
+  };
+
   const fetchRequests = async () => {
     try {
       setLoading(true);
-      const res = await api.get("/trade/requests");
-      console.log("Trade requests fetched:", res.data);
-      if (res.data && typeof res.data === "object") {
-        setRequests({
-          received: Array.isArray(res.data.received)
-            ? res.data.received
-            : [],
-          sent: Array.isArray(res.data.sent) ? res.data.sent : [],
-        });
-      }
+      const [received, sent] = await Promise.all([
+        fetchPage("received"),
+        fetchPage("sent"),
+      ]);
+      setRequests({ received: received.items, sent: sent.items });
+      setCursors({ received: received.cursor, sent: sent.cursor });
     } catch (err) {
       console.error(
         "Error fetching requests:",
@@ -39,11 +46,33 @@ function Requests() {
     }
   };
 
+  const loadMore = async (direction) => {
+    if (!cursors[direction]) return;
+    try {
+      const page = await fetchPage(direction, cursors[direction]);
+      setRequests((prev) => ({
+        ...prev,
+        [direction]: [...prev[direction], ...page.items],
+      }));
+      setCursors((prev) => ({ ...prev, [direction]: page.cursor }));
+    } catch (err) {
+      console.error(
+        "Error fetching requests:",
+        err.response?.data || err.message
+      );
+    }
+  };
+
   const handleAction = async (reqId, action) => {
     try {
       const res = await api.put(`/trade/requests/${reqId}/${action}`);
       console.log(`Request ${action}:`, res.data);
-      fetchRequests();
+      setRequests((prev) => ({
+        ...prev,
+        received: prev.received.map((r) =>
+          r.id === reqId ? { ...r, status: res.data.status } : r
+        ),
+      }));
     } catch (err) {
       console.error(
         `Error updating request:`,
@@ -86,7 +115,7 @@ function Requests() {
             <p className="text-gray-500 text-center">No received requests.</p>
           ) : (
             <div className="space-y-3">
-              {requests.received.reverse().map((req) => (
+              {requests.received.map((req) => (
                 <div
                   key={req.id}
                   className="p-4 bg-gray-50 shadow-sm rounded-xl border border-gray-200"
@@ -154,6 +183,16 @@ function Requests() {
               ))}
             </div>
           )}
+          {cursors.received && (
+            <div className="flex justify-center mt-4">
+              <button
+                onClick={() => loadMore("received")}
+                className="bg-gray-200 text-gray-700 px-4 py-1 rounded hover:bg-gray-300 transition"
+              >
+                Load more
+              </button>
+            </div>
+          )}
         </section>
 
         <section className="bg-white rounded-2xl shadow-sm p-5 border border-gray-200">
@@ -165,7 +204,7 @@ function Requests() {
             <p className="text-gray-500 text-center">No sent requests.</p>
           ) : (
             <div className="space-y-3">
-              {requests.sent.reverse().map((req) => (
+              {requests.sent.map((req) => (
                 <div
                   key={req.id}
                   className="p-4 bg-gray-50 shadow-sm rounded-xl border border-gray-200"
@@ -216,6 +255,16 @@ function Requests() {
               ))}
             </div>
           )}
+          {cursors.sent && (
+            <div className="flex justify-center mt-4">
+              <button
+                onClick={() => loadMore("sent")}
+                className="bg-gray-200 text-gray-700 px-4 py-1 rounded hover:bg-gray-300 transition"
+              >
+                Load more
+              </button>
+            </div>
+          )}
         </section>
       </div>
     </div>
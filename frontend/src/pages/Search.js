@@ -1,21 +1,28 @@
 import React, { useState, useEffect } from "react";
 import { Link } from "react-router-dom";
-import API from "../services/api";
+import API, { getSearchFacets, getSuggestions } from "../services/api";
 
 export default function Search() {
   const [query, setQuery] = useState("");
   const [category, setCategory] = useState("");
   const [skills, setSkills] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
   const [requests, setRequests] = useState({ sent: [] });
+  const [suggestions, setSuggestions] = useState([]);
+  const [categories, setCategories] = useState([]);
 
-  const fetchResults = async () => {
+  const fetchResults = async (cursor = null) => {
     try {
       setLoading(true);
       setError("");
-      const res = await API.get(`/search?q=${query}&category=${category}`);
-      setSkills(res.data || []);
+      const res = await API.get("/search", {
+        params: { q: query, category, cursor: cursor || undefined },
+      });
+      const items = res.data?.items || [];
+      setSkills((prev) => (cursor ? [...prev, ...items] : items));
+      setNextCursor(res.data?.next_cursor || null);
     } catch (err) {
       console.error("Error searching skills:", err);
       setError("Failed to fetch skills. Please try again.");
@@ -24,10 +31,28 @@ export default function Search() {
     }
   };
 
+  useEffect(() => {
+    if (!query.trim()) {
+      setSuggestions([]);
+      return undefined;
+    }
+    const timer = setTimeout(async () => {
+      try {
+        const res = await getSuggestions(query, "skill");
+        setSuggestions(res.data?.items || []);
+      } catch (err) {
+        setSuggestions([]);
+      }
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [query]);
+
   useEffect(() => {
     const fetchRequests = async () => {
       try {
-        const res = await API.get("/trade/requests");
+        const res = await API.get("/trade/requests", {
+          params: { direction: "sent", status: "pending", limit: 200 },
+        });
         console.log("Trade requests:", res.data);
         if (res.data?.sent) setRequests({ sent: res.data.sent });
       } catch (err) {
@@ -35,7 +60,17 @@ export default function Search() {
       }
     };
 
+    const fetchCategories = async () => {
+      try {
+        const res = await getSearchFacets({ facet: "category", limit: 100 });
+        setCategories(res.data?.categories || []);
+      } catch (err) {
+        console.error("Error fetching categories:", err);
+      }
+    };
+
     fetchRequests();
+    fetchCategories();
     fetchResults();
   }, []);
 
@@ -47,7 +82,9 @@ export default function Search() {
       });
       alert("Trade request sent successfully!");
 
-      const res = await API.get("/trade/requests");
+      const res = await API.get("/trade/requests", {
+        params: { direction: "sent", status: "pending", limit: 200 },
+      });
       if (res.data?.sent) setRequests({ sent: res.data.sent });
     } catch (err) {
       console.error("Trade request failed:", err);
@@ -80,24 +117,31 @@ export default function Search() {
           placeholder="Search by skill name..."
           value={query}
           onChange={(e) => setQuery(e.target.value)}
+          list="skill-suggestions"
           className="border px-4 py-2 rounded w-full md:w-1/3 shadow-sm focus:ring focus:ring-blue-200"
         />
 
+        <datalist id="skill-suggestions">
+          {suggestions.map((s) => (
+            <option key={s.text} value={s.text} />
+          ))}
+        </datalist>
+
         <select
           value={category}
           onChange={(e) => setCategory(e.target.value)}
           className="border px-4 py-2 rounded shadow-sm w-full md:w-1/5"
         >
           <option value="">All Categories</option>
-          <option value="Programming">Programming</option>
-          <option value="Design">Design</option>
-          <option value="Marketing">Marketing</option>
-          <option value="Writing">Writing</option>
-          <option value="Business">Business</option>
+          {categories.map((c) => (
+            <option key={c.name} value={c.name}>
+              {c.name} ({c.count})
+            </option>
+          ))}
         </select>
 
         <button
-          onClick={fetchResults}
+          onClick={() => fetchResults()}
           className="bg-blue-600 hover:bg-blue-700 text-white px-5 py-2 rounded transition"
         >
           Search
@@ -163,6 +207,17 @@ export default function Search() {
           ))}
         </div>
       )}
+
+      {!loading && nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            onClick={() => fetchResults(nextCursor)}
+            className="bg-white border border-gray-300 hover:bg-gray-100 text-gray-700 px-5 py-2 rounded transition"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 }
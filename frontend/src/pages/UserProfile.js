@@ -25,7 +25,9 @@ export default function UserProfile() {
   useEffect(() => {
     const fetchRequests = async () => {
       try {
-        const res = await API.get("/trade/requests");
+        const res = await API.get("/trade/requests", {
+          params: { direction: "sent", status: "pending", limit: 200 },
+        });
         console.log("Trade requests (UserProfile):", res.data);
         if (res.data?.sent) setRequests({ sent: res.data.sent });
       } catch (err) {
@@ -59,7 +61,9 @@ export default function UserProfile() {
       });
       alert("Trade request sent successfully!");
 
-      const res = await API.get("/trade/requests");
+      const res = await API.get("/trade/requests", {
+        params: { direction: "sent", status: "pending", limit: 200 },
+      });
       if (res.data?.sent) setRequests({ sent: res.data.sent });
     } catch (err) {
       console.error("Failed to send request:", err);
@@ -37,11 +37,20 @@ export const getSkills = () => API.get("/skills");
 export const updateSkill = (id, data) => API.put(`/skills/${id}`, data);
 export const deleteSkill = (id) => API.delete(`/skills/${id}`);
 
+export const getSuggestions = (q, kind) =>
+  API.get("/search/suggest", { params: { q, kind: kind || undefined } });
+
+export const getSearchFacets = (params) => API.get("/search/facets", { params });
+
 export const sendTradeRequest = (data) => API.post("/trade/request", data);
-export const getTradeRequests = () => API.get("/trade/requests");
+export const getTradeRequests = (params) => API.get("/trade/requests", { params });
+export const getTradeRequestCounts = () => API.get("/trade/requests/counts");
 export const acceptTradeRequest = (id) => API.put(`/trade/requests/${id}/accept`);
 export const rejectTradeRequest = (id) => API.put(`/trade/requests/${id}/reject`);
 
+export const getPresence = (ids) =>
+  API.get("/presence", { params: { ids: ids.join(",") } });
+
 export const getChatHistory = (requestId) =>
   API.get(`/chat/${requestId}`);
 